@@ -1,7 +1,7 @@
 from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session
-from flask_mysqldb import MySQL
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 import bcrypt
+import click
 import os
 from datetime import datetime, timedelta
 
@@ -13,17 +13,27 @@ app = Flask(__name__)
 app.config.from_object(Config)
 
 # Initialize extensions
-mysql = MySQL(app)  # This attaches MySQL to app directly
+from extensions import mysql
+mysql.init_app(app)  # Pooled connections, shared with the models
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
 # Import models after initializing app and MySQL
-from models.user import User
+from models.user import User, user_cache
 from models.exam import Exam
 from models.question import Question
 from models.exam_session import ExamSession
-from models.proctoring import ProctoringLog
+from models.proctoring import ProctoringLog, proctoring_log_writer
+from models.schema import schema_registry
+from models.grading import answer_key_cache
+from models.exam_paper import exam_paper_cache
+from models.exam_schedule import exam_schedule
+from models.exam_stats import exam_stats_cache
+from models.screenshot_pipeline import screenshot_pipeline
+from models.screenshot_dedup import near_duplicate_filter
+from models.proctoring_coalescer import proctoring_coalescer
+from models.grading_queue import GradingQueue, grading_workers
 
 def create_app(config_class=Config):
     """
@@ -35,6 +45,19 @@ def create_app(config_class=Config):
     # Initialize extensions with the app
     mysql.init_app(app)
     login_manager.init_app(app)
+    proctoring_log_writer.init_app(app)
+    screenshot_pipeline.init_app(app)
+    near_duplicate_filter.init_app(app)
+    proctoring_coalescer.init_app(app)
+    grading_workers.init_app(app)
+    exam_schedule.init_app(app)
+    user_cache.configure(app.config.get('USER_CACHE_SIZE'), app.config.get('USER_CACHE_TTL'))
+    answer_key_cache.configure(app.config.get('ANSWER_KEY_CACHE_SIZE'), app.config.get('ANSWER_KEY_CACHE_TTL'))
+    exam_paper_cache.configure(app.config.get('EXAM_PAPER_CACHE_SIZE'), app.config.get('EXAM_PAPER_CACHE_TTL'))
+    exam_stats_cache.configure(app.config.get('EXAM_STATS_CACHE_SIZE'), app.config.get('EXAM_STATS_CACHE_TTL'))
+    
+    # Inspect/create the proctoring tables once instead of probing on every request
+    schema_registry.init_app(app)
     
     # Load user from session
     @login_manager.user_loader
@@ -62,6 +85,34 @@ def create_app(config_class=Config):
                 return app.redirect(url_for('student.dashboard'))
         return render_template('index.html')
     
+    @app.cli.command('rebuild-exam-stats')
+    def rebuild_exam_stats():
+        """Recompute the exam_stats rollup of every exam from exam_sessions."""
+        from models.exam_stats_rollup import ExamStatsRollup
+        if not ExamStatsRollup.is_available(fresh=True):
+            print("exam_stats table does not exist, run setup_database.py first.")
+            return
+        cursor = mysql.connection.cursor()
+        ExamStatsRollup.rebuild(cursor)
+        mysql.connection.commit()
+        cursor.close()
+        exam_stats_cache.clear()
+        print("exam_stats rebuilt.")
+    
+    @app.cli.command('grade-submissions')
+    @click.option('--workers', type=int, default=None, help='Grading threads, GRADING_WORKERS by default.')
+    @click.option('--retry-failed', is_flag=True, help='Queue failed jobs again before starting.')
+    def grade_submissions(workers, retry_failed):
+        """Run a dedicated pool of grading workers until interrupted."""
+        if retry_failed:
+            print(f"Queued {GradingQueue.retry_failed()} failed grading jobs again.")
+        grading_workers.ensure_started(workers)
+        print(f"Grading submissions with {workers or grading_workers.workers} workers, press Ctrl+C to stop.")
+        try:
+            grading_workers.wait()
+        except KeyboardInterrupt:
+            grading_workers.stop()
+    
     # Create upload folder if it doesn't exist
     if 'UPLOAD_FOLDER' in app.config:
         os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
@@ -1,13 +1,21 @@
-from flask import Blueprint, render_template, redirect, url_for, request, flash, send_file, current_app
+from flask import Blueprint, render_template, redirect, url_for, request, flash, send_file, current_app, abort, jsonify, Response, stream_with_context
 from flask_login import login_required, current_user
 from datetime import datetime
-import pandas as pd
 import io
+import tempfile
 from extensions import mysql
 from models.exam import Exam
 from models.question import Question
 from models.exam_session import ExamSession
-from models.proctoring import ProctoringLog
+from models.proctoring import ProctoringLog, proctoring_log_writer
+from models.screenshot_pipeline import screenshot_pipeline
+from models.screenshot_dedup import near_duplicate_filter
+from models.proctoring_coalescer import proctoring_coalescer
+from models.grading_queue import grading_workers
+from models.grading import GradingEngine, answer_key_cache
+from models.exam_stats import ExamStatistics, exam_stats_cache
+from models.result_export import ResultExporter
+from models.pagination import Page, decode_cursor
 
 # Import the mysql instance or use current_app
 # You have two options:
@@ -24,11 +32,15 @@ def dashboard():
         flash('Unauthorized access', 'danger')
         return redirect(url_for('main.index'))
     
-    exams = Exam.get_all_exams()
+    page_size = current_app.config.get('ADMIN_PAGE_SIZE', 50)
+    after = decode_cursor(request.args.get('after'), 1)
+    exams = Page.build(Exam.get_all_exams(limit=page_size + 1, after=after[0] if after else None),
+                       page_size, lambda exam: (exam.id,))
     # Get recent exam sessions for the dashboard
     recent_sessions = ExamSession.get_recent_sessions()
     
-    return render_template('admin/dashboard.html', exams=exams, recent_sessions=recent_sessions)
+    return render_template('admin/dashboard.html', exams=exams, recent_sessions=recent_sessions,
+                           is_first_page=after is None)
 
 @admin_bp.route('/create_exam', methods=['GET', 'POST'])
 @login_required
@@ -81,14 +93,46 @@ def add_questions(exam_id):
 @admin_bp.route('/exam/<int:exam_id>/question/<int:question_id>/edit', methods=['GET', 'POST'])
 @login_required
 def edit_question(exam_id, question_id):
-    # Implement question editing logic
-    pass
+    if current_user.role != 'admin':
+        flash('Unauthorized access', 'danger')
+        return redirect(url_for('main.index'))
+    
+    exam = Exam.get_by_id(exam_id)
+    question = Question.get_by_id(question_id)
+    if not exam or not question or question.exam_id != exam_id:
+        flash('Question not found', 'danger')
+        return redirect(url_for('admin.dashboard'))
+    
+    if request.method == 'POST':
+        question_text = request.form['question_text']
+        option_a = request.form['option_a']
+        option_b = request.form['option_b']
+        option_c = request.form['option_c']
+        option_d = request.form['option_d']
+        correct_option = request.form['correct_option']
+        marks = int(request.form['marks'])
+        
+        Question.update_question(question_id, question_text, option_a, option_b, option_c, option_d, correct_option, marks)
+        flash('Question updated successfully', 'success')
+        return redirect(url_for('admin.add_questions', exam_id=exam_id))
+    
+    return render_template('admin/edit_question.html', exam=exam, question=question)
 
 @admin_bp.route('/exam/<int:exam_id>/question/<int:question_id>/delete')
 @login_required
 def delete_question(exam_id, question_id):
-    # Implement question deletion logic
-    pass
+    if current_user.role != 'admin':
+        flash('Unauthorized access', 'danger')
+        return redirect(url_for('main.index'))
+    
+    question = Question.get_by_id(question_id)
+    if not question or question.exam_id != exam_id:
+        flash('Question not found', 'danger')
+        return redirect(url_for('admin.add_questions', exam_id=exam_id))
+    
+    Question.delete_question(question_id)
+    flash('Question deleted successfully', 'success')
+    return redirect(url_for('admin.add_questions', exam_id=exam_id))
 
 @admin_bp.route('/exam/<int:exam_id>/results')
 @login_required
@@ -102,16 +146,18 @@ def view_exam_results(exam_id):
         flash('Exam not found', 'danger')
         return redirect(url_for('admin.dashboard'))
     
-    # Get exam results
-    results = ExamSession.get_results_by_exam(exam_id)
-    
-    # Calculate statistics
-    stats = calculate_exam_stats(results, exam)
+    # One page of results, following the (score, id) cursor of the previous page
+    page_size = current_app.config.get('ADMIN_PAGE_SIZE', 50)
+    after = decode_cursor(request.args.get('after'), 2)
+    results = Page.build(ExamSession.get_results_by_exam(exam_id, limit=page_size + 1, after=after),
+                         page_size, lambda result: (result['score'], result['id']))
+    rank_offset = request.args.get('rank', 0, type=int) if after else 0
     
-    # Get question statistics 
-    question_stats = calculate_question_stats(exam_id)
-    
-    total_marks = calculate_total_marks(exam_id)
+    # Summary and per-question statistics from SQL aggregates, cached until the next submission
+    statistics = ExamStatistics.get(exam_id)
+    stats = statistics['summary']
+    question_stats = statistics['questions']
+    total_marks = statistics['total_marks']
     
     # Pass helper function to template to fix the dictionary access issue
     def get_session_url(result):
@@ -131,11 +177,12 @@ def view_exam_results(exam_id):
                            stats=stats, 
                            question_stats=question_stats,
                            total_marks=total_marks,
+                           rank_offset=rank_offset,
                            get_session_url=get_session_url)
 
-@admin_bp.route('/exam/<int:exam_id>/export')
+@admin_bp.route('/exam/<int:exam_id>/regrade', methods=['POST'])
 @login_required
-def export_results(exam_id):
+def regrade_exam(exam_id):
     if current_user.role != 'admin':
         flash('Unauthorized access', 'danger')
         return redirect(url_for('main.index'))
@@ -145,71 +192,55 @@ def export_results(exam_id):
         flash('Exam not found', 'danger')
         return redirect(url_for('admin.dashboard'))
     
-    # Get exam results
-    results = ExamSession.get_results_by_exam(exam_id)
-    total_marks = calculate_total_marks(exam_id)
+    try:
+        summary = GradingEngine.regrade_exam(exam_id)
+        flash(f"Re-graded {summary['sessions']} sessions: {summary['sessions_changed']} scores changed, "
+              f"{summary['answers_changed']} answers changed", 'success')
+    except Exception as e:
+        current_app.logger.error(f"Error re-grading exam {exam_id}: {str(e)}", exc_info=True)
+        flash(f'Error re-grading exam: {str(e)}', 'danger')
     
-    # Convert to DataFrame for Excel export
-    data = []
-    for result in results:
-        # Handle both object and dictionary format
-        if isinstance(result, dict):
-            student_name = result.get('student_name', '')
-            start_time = result.get('start_time', datetime.now())
-            end_time = result.get('end_time', datetime.now())
-            score = result.get('score', 0)
-        else:
-            student_name = result.student_name
-            start_time = result.start_time
-            end_time = result.end_time
-            score = result.score
-            
-        data.append({
-            'Student Name': student_name,
-            'Start Time': start_time.strftime('%Y-%m-%d %H:%M') if hasattr(start_time, 'strftime') else start_time,
-            'End Time': end_time.strftime('%Y-%m-%d %H:%M') if hasattr(end_time, 'strftime') else end_time,
-            'Score': score,
-            'Total Marks': total_marks,
-            'Percentage': round(score / total_marks * 100) if total_marks > 0 else 0,
-            'Status': 'Pass' if score / total_marks >= 0.7 else 
-                      'Average' if score / total_marks >= 0.4 else 'Fail'
-        })
-    
-    df = pd.DataFrame(data)
-    
-    # Create Excel file in memory
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        df.to_excel(writer, sheet_name='Results', index=False)
-        
-        # Access the workbook and worksheet objects
-        workbook = writer.book
-        worksheet = writer.sheets['Results']
-        
-        # Add formats
-        header_format = workbook.add_format({'bold': True, 'bg_color': '#4472C4', 'color': 'white'})
-        pass_format = workbook.add_format({'bg_color': '#C6EFCE'})
-        avg_format = workbook.add_format({'bg_color': '#FFEB9C'})
-        fail_format = workbook.add_format({'bg_color': '#FFC7CE'})
-        
-        # Apply header format
-        for col_num, value in enumerate(df.columns.values):
-            worksheet.write(0, col_num, value, header_format)
-        
-        # Auto-adjust columns width
-        for i, col in enumerate(df.columns):
-            max_len = max(df[col].astype(str).map(len).max(), len(col)) + 2
-            worksheet.set_column(i, i, max_len)
+    return redirect(url_for('admin.view_exam_results', exam_id=exam_id))
+
+@admin_bp.route('/exam/<int:exam_id>/export')
+@login_required
+def export_results(exam_id):
+    if current_user.role != 'admin':
+        flash('Unauthorized access', 'danger')
+        return redirect(url_for('main.index'))
     
-    output.seek(0)
+    exam = Exam.get_by_id(exam_id)
+    if not exam:
+        flash('Exam not found', 'danger')
+        return redirect(url_for('admin.dashboard'))
     
-    # Generate filename
-    filename = f"{exam.title.replace(' ', '_')}_results_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx"
+    # Needs its own query, so it must run before the streaming cursor is opened
+    total_marks = ExamStatistics.total_marks(exam_id)
+    chunk_size = current_app.config.get('EXPORT_CHUNK_SIZE', 1000)
+    export_format = request.args.get('format', 'xlsx')
+    base_filename = f"{exam.title.replace(' ', '_')}_results_{datetime.now().strftime('%Y%m%d_%H%M')}"
+    
+    if export_format == 'csv':
+        # Rows go to the client as they are read from the server-side cursor
+        return Response(
+            stream_with_context(ResultExporter.iter_csv(exam_id, total_marks, chunk_size)),
+            mimetype='text/csv',
+            headers={'Content-Disposition': f'attachment; filename="{base_filename}.csv"'}
+        )
+    
+    # The workbook is assembled in a temporary file, which is then streamed and removed on close
+    output = tempfile.TemporaryFile(suffix='.xlsx')
+    try:
+        ResultExporter.write_xlsx(output, exam_id, total_marks, chunk_size)
+    except Exception:
+        output.close()
+        raise
+    output.seek(0)
     
     return send_file(
         output,
         as_attachment=True,
-        download_name=filename,
+        download_name=f"{base_filename}.xlsx",
         mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
     )
 
@@ -262,7 +293,7 @@ def view_student_result(session_id):
     exam_questions = Question.get_by_exam_id(exam.id)
     
     # Calculate total possible marks
-    total_marks = calculate_total_marks(exam.id)
+    total_marks = ExamStatistics.total_marks(exam.id)
     
     return render_template('admin/student_result.html',
                           session=session_info,
@@ -284,78 +315,88 @@ def view_proctoring_logs(session_id):
         flash('Exam session not found', 'danger')
         return redirect(url_for('admin.dashboard'))
     
-    logs = ProctoringLog.get_logs_by_session(session_id)
-    return render_template('admin/proctoring_logs.html', logs=logs, session=session_info)
+    page_size = current_app.config.get('ADMIN_PAGE_SIZE', 50)
+    after = decode_cursor(request.args.get('after'), 2)
+    logs = Page.build(ProctoringLog.get_logs_by_session(session_id, limit=page_size + 1, after=after),
+                      page_size, lambda log: (log.timestamp, log.id))
+    return render_template('admin/proctoring_logs.html', logs=logs, session=session_info,
+                           is_first_page=after is None)
 
-# Helper functions
-def calculate_exam_stats(results, exam):
-    total_students = len(results)
-    if total_students == 0:
-        return {
-            'total_students': 0,
-            'average_score': 0,
-            'pass_rate': 0
-        }
-    
-    # Handle results as either dictionaries or objects
-    total_score = 0
-    for result in results:
-        if isinstance(result, dict):
-            total_score += result.get('score', 0)
-        else:
-            total_score += getattr(result, 'score', 0)
-    
-    average_score = total_score / total_students
-    
-    # Calculate total marks for this exam
-    total_marks = calculate_total_marks(exam.id)
-    
-    # Pass rate (percentage of students who scored >= 70%)
-    passed_students = 0
-    for result in results:
-        score = result.get('score', 0) if isinstance(result, dict) else getattr(result, 'score', 0)
-        if score / total_marks >= 0.7:
-            passed_students += 1
-    
-    pass_rate = (passed_students / total_students) * 100 if total_students > 0 else 0
-    
-    return {
-        'total_students': total_students,
-        'average_score': average_score,
-        'pass_rate': round(pass_rate)
-    }
+# A log's screenshot never changes once written
+SCREENSHOT_MAX_AGE = 31536000
 
-def calculate_question_stats(exam_id):
-    # Instead of direct SQL queries, let's use the models we've already imported
-    # This assumes you have proper ORM models set up
-    
-    # If you have a Question model with appropriate methods
-    questions = Question.get_by_exam_id(exam_id)
-    stats = []
-    
-    for question in questions:
-        # This assumes your models have methods to get answer statistics
-        # If not, you'll need to implement them according to your data model
-        correct_count = question.get_correct_answers_count() if hasattr(question, 'get_correct_answers_count') else 0
-        incorrect_count = question.get_incorrect_answers_count() if hasattr(question, 'get_incorrect_answers_count') else 0
-        
-        total_attempts = correct_count + incorrect_count
-        success_rate = (correct_count / total_attempts * 100) if total_attempts > 0 else 0
-        
-        stats.append({
-            'question_text': question.question_text,
-            'correct_count': correct_count,
-            'incorrect_count': incorrect_count,
-            'success_rate': round(success_rate)
-        })
-    
-    return stats
+# Until its thumbnail is generated, the thumbnail URL serves the full image briefly
+SCREENSHOT_FALLBACK_MAX_AGE = 60
 
-def calculate_total_marks(exam_id):
-    # Use the Question model instead of direct SQL
-    questions = Question.get_by_exam_id(exam_id)
+@admin_bp.route('/proctoring/screenshot/<int:log_id>')
+@login_required
+def view_log_screenshot(log_id):
+    if current_user.role != 'admin':
+        abort(403)
+    return send_log_screenshot(log_id, thumbnail=False)
+
+@admin_bp.route('/proctoring/screenshot/<int:log_id>/thumbnail')
+@login_required
+def view_log_thumbnail(log_id):
+    if current_user.role != 'admin':
+        abort(403)
+    return send_log_screenshot(log_id, thumbnail=True)
+
+def send_log_screenshot(log_id, thumbnail):
+    screenshot = ProctoringLog.get_screenshot(log_id, thumbnail=thumbnail)
+    if screenshot is None:
+        abort(404)
+    
+    max_age = SCREENSHOT_MAX_AGE if screenshot['final'] else SCREENSHOT_FALLBACK_MAX_AGE
+    if 'path' in screenshot:
+        response = send_file(screenshot['path'], mimetype=screenshot['mimetype'], etag=screenshot['etag'],
+                             max_age=max_age, conditional=True)
+    else:
+        # Legacy inline screenshot decoded from the row
+        response = send_file(io.BytesIO(screenshot['bytes']), mimetype=screenshot['mimetype'],
+                             etag=screenshot['etag'], max_age=max_age, conditional=True)
+    
+    # Evidence is only for logged in admins, keep it out of shared caches
+    response.cache_control.public = False
+    response.cache_control.private = True
+    if screenshot['final']:
+        response.cache_control.immutable = True
+    return response
+
+@admin_bp.route('/api/proctoring/queue_stats')
+@login_required
+def proctoring_queue_stats():
+    if current_user.role != 'admin':
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 403
     
-    # Sum the marks for all questions
-    total_marks = sum(question.marks for question in questions) if questions else 0
+    return jsonify({'status': 'success', 'stats': proctoring_log_writer.stats()})
+
+@admin_bp.route('/api/cache_stats')
+@login_required
+def cache_stats():
+    if current_user.role != 'admin':
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 403
+    
+    from models.exam_paper import exam_paper_cache
+    from models.user import user_cache
+    return jsonify({
+        'status': 'success',
+        'stats': {
+            'users': user_cache.stats(),
+            'answer_keys': answer_key_cache.stats(),
+            'exam_papers': exam_paper_cache.stats(),
+            'exam_stats': exam_stats_cache.stats(),
+            'screenshot_pipeline': screenshot_pipeline.stats(),
+            'screenshot_dedup': near_duplicate_filter.stats(),
+            'proctoring_coalescer': proctoring_coalescer.stats(),
+            'grading_workers': grading_workers.stats()
+        }
+    })
+
+@admin_bp.route('/api/db/pool_stats')
+@login_required
+def db_pool_stats():
+    if current_user.role != 'admin':
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 403
     
-    return total_marks
\ No newline at end of file
+    return jsonify({'status': 'success', 'stats': mysql.stats()})
@@ -3,13 +3,19 @@ from flask_login import login_required, current_user
 from datetime import datetime
 from extensions import mysql
 
+from models.answer_draft import AnswerDraft
 from models.exam import Exam
-from models.question import Question
+from models.exam_paper import exam_paper_cache
 from models.exam_session import ExamSession
-from models.proctoring import ProctoringLog
+from models.grading_queue import GradingQueue, grading_workers
+from models.proctoring import ProctoringLog, proctoring_log_writer
+from models.student_summary import StudentSummary
 
 student_bp = Blueprint('student', __name__, url_prefix='/student')
 
+# Completed sessions listed on the dashboard
+RECENT_SESSIONS_LIMIT = 20
+
 @student_bp.route('/dashboard')
 @login_required
 def dashboard():
@@ -17,94 +23,39 @@ def dashboard():
         flash('Unauthorized access', 'danger')
         return redirect(url_for('main.index'))
     
+    # Active and upcoming exams come from the in-memory schedule index
     active_exams = Exam.get_active_exams()
+    upcoming_exams = Exam.count_upcoming_exams()
     
-    # Get completed exam sessions for the current user
     cursor = mysql.connection.cursor()
-    cursor.execute("""
-        SELECT COUNT(*) as completed_count 
-        FROM exam_sessions 
-        WHERE student_id = %s AND status = 'completed'
-    """, (current_user.id,))
-    completed_result = cursor.fetchone()
-    
-    # Print the structure to debug
-    print("Completed result type:", type(completed_result))
-    print("Completed result value:", completed_result)
-    
-    # Handle different result formats
-    completed_exams = 0
-    if completed_result:
-        if isinstance(completed_result, dict):
-            completed_exams = completed_result.get('completed_count', 0)
-        elif isinstance(completed_result, tuple):
-            completed_exams = completed_result[0] if completed_result else 0
-        elif hasattr(completed_result, 'completed_count'):
-            completed_exams = completed_result.completed_count
-    
-    # Get upcoming exams (exams that haven't started yet)
-    cursor.execute("""
-        SELECT COUNT(*) as upcoming_count 
-        FROM exams 
-        WHERE start_time > NOW()
-    """)
-    upcoming_result = cursor.fetchone()
-    upcoming_exams = 0
-    if upcoming_result:
-        if isinstance(upcoming_result, dict):
-            upcoming_exams = upcoming_result.get('upcoming_count', 0)
-        elif isinstance(upcoming_result, tuple):
-            upcoming_exams = upcoming_result[0] if upcoming_result else 0
-    
-    # Calculate average score for completed exams
-    cursor.execute("""
-        SELECT AVG(score) as avg_score 
-        FROM exam_sessions 
-        WHERE student_id = %s AND status = 'completed' AND score IS NOT NULL
-    """, (current_user.id,))
-    avg_result = cursor.fetchone()
-    avg_score = 'N/A'
-    if avg_result:
-        if isinstance(avg_result, dict) and avg_result.get('avg_score') is not None:
-            avg_score = round(float(avg_result.get('avg_score')))
-        elif isinstance(avg_result, tuple) and avg_result[0] is not None:
-            avg_score = round(float(avg_result[0]))
-    
-    # Get completed sessions with details for the Results section
+    
+    # Completed count and average score come precomputed from the student's summary row
+    if StudentSummary.is_available():
+        summary = StudentSummary.get(current_user.id)
+        completed_exams = summary.completed_count
+        average = summary.average_score
+    else:
+        cursor.execute("""
+            SELECT COUNT(*) as completed_count, AVG(score) as avg_score
+            FROM exam_sessions 
+            WHERE student_id = %s AND status = 'completed'
+        """, (current_user.id,))
+        totals = cursor.fetchone()
+        completed_exams = totals['completed_count']
+        average = totals['avg_score']
+    avg_score = round(float(average)) if average is not None else 'N/A'
+    
+    # Get the most recent completed sessions with details for the Results section
     cursor.execute("""
         SELECT es.id, es.start_time, es.end_time, es.score, e.title as exam_title
         FROM exam_sessions es
         JOIN exams e ON es.exam_id = e.id
         WHERE es.student_id = %s AND es.status = 'completed'
         ORDER BY es.end_time DESC
-    """, (current_user.id,))
-    raw_sessions = cursor.fetchall()
-    
-    completed_sessions = []
-    
-    # Print session structure to debug
-    if raw_sessions and len(raw_sessions) > 0:
-        print("Session result type:", type(raw_sessions[0]))
-        print("Sample session:", raw_sessions[0])
-    
-    # Handle different result formats for sessions
-    for row in raw_sessions:
-        if isinstance(row, dict):
-            # If results are dictionaries
-            completed_sessions.append(row)
-        elif isinstance(row, tuple):
-            # If results are tuples, convert to dictionary
-            session = {
-                'id': row[0],
-                'start_time': row[1],
-                'end_time': row[2],
-                'score': row[3],
-                'exam_title': row[4]
-            }
-            completed_sessions.append(session)
-    
+        LIMIT %s
+    """, (current_user.id, RECENT_SESSIONS_LIMIT))
+    completed_sessions = cursor.fetchall()
     cursor.close()
-    mysql.connection.commit()
     
     return render_template('student/dashboard.html', 
                           active_exams=active_exams,
@@ -131,11 +82,11 @@ def start_exam(exam_id):
         flash('Exam is not active at this time', 'danger')
         return redirect(url_for('student.dashboard'))
     
-    # Check if student has already completed this exam
+    # Check if student has already completed this exam, submitted sessions may still be waiting to be graded
     cursor = mysql.connection.cursor()
     cursor.execute("""
         SELECT * FROM exam_sessions 
-        WHERE student_id = %s AND exam_id = %s AND status = 'completed'
+        WHERE student_id = %s AND exam_id = %s AND status IN ('completed', 'submitted')
     """, (current_user.id, exam_id))
     completed_session = cursor.fetchone()
     cursor.close()
@@ -179,13 +130,19 @@ def take_exam(exam_id, session_id):
         flash('Exam not found', 'danger')
         return redirect(url_for('student.dashboard'))
     
-    questions = Question.get_by_exam_id(exam_id)
-    questions_dict = [question.to_dict() for question in questions]
-    if not questions:
+    # Serialized once per exam version and shared by every student taking it
+    paper = exam_paper_cache.get(exam_id)
+    if not len(paper):
         flash('No questions found for this exam', 'danger')
         return redirect(url_for('student.dashboard'))
     
-    return render_template('student/take_exam.html', exam=exam, questions=questions_dict, session_id=session_id)
+    # Answers autosaved before a reload or on another device
+    saved_answers = {str(question_id): option for question_id, option in AnswerDraft.get(session_id).items()}
+    
+    return render_template('student/take_exam.html', exam=exam, questions=paper.questions,
+                           questions_json=paper.questions_json, session_id=session_id,
+                           saved_answers=saved_answers,
+                           autosave_delay=current_app.config.get('ANSWER_AUTOSAVE_DELAY_MS', 2000))
 
 @student_bp.route('/api/proctoring/log', methods=['POST'])
 @login_required
@@ -208,6 +165,13 @@ def log_proctoring_event():
         return jsonify({'status': 'error', 'message': 'Missing required fields'}), 400
     
     try:
+        if proctoring_log_writer.enabled:
+            # Hand the event to the write-behind queue instead of waiting on the database
+            event = {'session_id': session_id, 'log_type': log_type, 'details': details, 'screenshot': screenshot}
+            if not proctoring_log_writer.enqueue(event):
+                return jsonify({'status': 'error', 'message': 'Proctoring log queue is full, retry later'}), 503
+            return jsonify({'status': 'success', 'queued': True}), 202
+        
         log_id = ProctoringLog.create_log(session_id, log_type, details, screenshot)
         current_app.logger.info(f"Proctoring log created: {log_id}, type: {log_type}, session: {session_id}")
         return jsonify({'status': 'success', 'log_id': log_id})
@@ -215,6 +179,111 @@ def log_proctoring_event():
         current_app.logger.error(f"Error creating proctoring log: {str(e)}", exc_info=True)
         return jsonify({'status': 'error', 'message': f'Error creating log: {str(e)}'}), 500
 
+# Upper bound on events per batch request, keeps the multi-row INSERT well under max_allowed_packet
+MAX_PROCTORING_BATCH_SIZE = 50
+
+@student_bp.route('/api/proctoring/log/batch', methods=['POST'])
+@login_required
+def log_proctoring_events_batch():
+    if current_user.role != 'student':
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 403
+
+    data = request.json
+    if not data:
+        current_app.logger.error("No JSON data received in proctoring batch request")
+        return jsonify({'status': 'error', 'message': 'No data received'}), 400
+
+    events = data.get('events')
+    if not isinstance(events, list) or not events:
+        return jsonify({'status': 'error', 'message': 'Expected a non-empty list of events'}), 400
+
+    if len(events) > MAX_PROCTORING_BATCH_SIZE:
+        return jsonify({'status': 'error', 'message': f'Too many events, maximum is {MAX_PROCTORING_BATCH_SIZE}'}), 413
+
+    # Keep only the client fields, the log timestamp is always the server's receive time
+    received_at = datetime.now()
+    events = [{
+        'session_id': event.get('session_id'),
+        'log_type': event.get('log_type'),
+        'details': event.get('details', ''),
+        'screenshot': event.get('screenshot'),
+        'received_at': received_at
+    } if isinstance(event, dict) else event for event in events]
+
+    try:
+        results = [None] * len(events)
+        session_ids = {}
+        for index, event in enumerate(events):
+            if not isinstance(event, dict) or not event.get('session_id') or not event.get('log_type'):
+                results[index] = {'error': 'Missing required fields'}
+                continue
+            try:
+                session_ids[index] = int(event['session_id'])
+            except (TypeError, ValueError):
+                results[index] = {'error': 'session_id must be an integer'}
+        
+        # Events may only be logged against the student's own sessions in progress, checked in one query
+        own_sessions = ExamSession.get_in_progress_ids(current_user.id, session_ids.values())
+        accepted = []
+        for index, session_id in session_ids.items():
+            if session_id in own_sessions:
+                accepted.append(index)
+            else:
+                results[index] = {'error': f'Invalid session_id: {session_id}'}
+        if not accepted:
+            return jsonify({'status': 'error', 'message': 'No valid events', 'results': results}), 400
+        
+        if proctoring_log_writer.enabled:
+            for index in accepted:
+                if proctoring_log_writer.enqueue(events[index]):
+                    results[index] = {'queued': True}
+                else:
+                    results[index] = {'error': 'Proctoring log queue is full, retry later', 'retryable': True}
+            queued = sum(1 for result in results if result.get('queued'))
+            if not queued:
+                return jsonify({'status': 'error', 'message': 'Proctoring log queue is full, retry later'}), 503
+            return jsonify({'status': 'success', 'queued': queued, 'results': results}), 202
+        
+        for index, result in zip(accepted, ProctoringLog.create_logs_bulk([events[index] for index in accepted])):
+            results[index] = result
+        created = sum(1 for result in results if 'log_id' in result)
+        current_app.logger.info(f"Proctoring batch processed: {created}/{len(events)} events created")
+        return jsonify({'status': 'success', 'created': created, 'results': results})
+    except Exception as e:
+        current_app.logger.error(f"Error creating proctoring log batch: {str(e)}", exc_info=True)
+        return jsonify({'status': 'error', 'message': f'Error creating logs: {str(e)}'}), 500
+
+# Upper bound on answers per autosave request
+MAX_AUTOSAVE_ANSWERS = 500
+
+@student_bp.route('/api/exam/autosave', methods=['POST'])
+@login_required
+def autosave_answers():
+    if current_user.role != 'student':
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 403
+    
+    data = request.json
+    if not data:
+        return jsonify({'status': 'error', 'message': 'Invalid request data. Expected JSON.'}), 400
+    
+    session_id = data.get('session_id')
+    answers = data.get('answers')
+    if not session_id or not isinstance(answers, dict):
+        return jsonify({'status': 'error', 'message': 'Missing session ID or answers'}), 400
+    
+    if len(answers) > MAX_AUTOSAVE_ANSWERS:
+        return jsonify({'status': 'error', 'message': f'Too many answers, maximum is {MAX_AUTOSAVE_ANSWERS}'}), 413
+    
+    try:
+        saved = AnswerDraft.save(session_id, current_user.id, answers)
+        return jsonify({'status': 'success', 'saved': saved})
+    except ValueError as e:
+        # Submitted, expired or someone else's session, retrying won't help
+        return jsonify({'status': 'error', 'message': str(e)}), 409
+    except Exception as e:
+        current_app.logger.error(f"Error autosaving answers for session_id {session_id}: {str(e)}", exc_info=True)
+        return jsonify({'status': 'error', 'message': f'Error saving answers: {str(e)}'}), 500
+
 @student_bp.route('/api/exam/submit', methods=['POST'])
 @login_required
 def submit_exam():
@@ -237,14 +306,47 @@ def submit_exam():
         current_app.logger.info(f"Attempting to submit exam for session_id: {session_id}, user: {current_user.id}")
         current_app.logger.debug(f"Received answers: {answers}")
 
+        if grading_workers.enabled:
+            # Store the answers and let the grading workers score them, the client polls the status URL
+            job_id = GradingQueue.enqueue(session_id, current_user.id, answers)
+            grading_workers.notify()
+            status_url = url_for('student.submission_status', session_id=session_id)
+            current_app.logger.info(f"Exam submission queued for session_id: {session_id}, job: {job_id}")
+            return jsonify({'status': 'accepted', 'status_url': status_url}), 202, {'Location': status_url}
+
         score = ExamSession.submit_answers(session_id, answers)
 
         current_app.logger.info(f"Exam submitted successfully for session_id: {session_id}. Score: {score}")
         return jsonify({'status': 'success', 'score': score})
+    except ValueError as e:
+        current_app.logger.warning(f"Rejected exam submission for session_id {session_id}: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 409
     except Exception as e:
         current_app.logger.error(f"Error submitting exam for session_id {session_id}: {str(e)}", exc_info=True)
         return jsonify({'status': 'error', 'message': f'An internal error occurred: {str(e)}'}), 500
 
+@student_bp.route('/api/exam/submission/<int:session_id>')
+@login_required
+def submission_status(session_id):
+    if current_user.role != 'student':
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 403
+    
+    job = GradingQueue.get_status(session_id, current_user.id)
+    if not job:
+        return jsonify({'status': 'error', 'message': 'Submission not found'}), 404
+    
+    if job['status'] == 'done':
+        return jsonify({'status': 'success', 'grading': 'done', 'score': job['score'],
+                        'results_url': url_for('student.view_results', session_id=session_id)})
+    if job['status'] == 'failed':
+        return jsonify({'status': 'error', 'grading': 'failed',
+                        'message': 'Your answers were saved but could not be graded, please contact the administrator'})
+    
+    # Pending jobs may have been queued before this process started grading
+    grading_workers.ensure_started()
+    retry_after = max(1, round(grading_workers.poll_interval))
+    return jsonify({'status': 'pending', 'grading': job['status']}), 200, {'Retry-After': str(retry_after)}
+
 @student_bp.route('/exam/results/<int:session_id>')
 @login_required
 def view_results(session_id):
@@ -258,6 +360,10 @@ def view_results(session_id):
         flash('Results not found or unauthorized', 'danger')
         return redirect(url_for('student.dashboard'))
     
+    if session.status == 'submitted':
+        flash('Your exam has been submitted and is being graded, check back shortly', 'info')
+        return redirect(url_for('student.dashboard'))
+    
     # Get exam details
     exam = Exam.get_by_id(session.exam_id)
     
@@ -12,10 +12,86 @@ class Config:
     MYSQL_DB = 'exam_portal'
     MYSQL_CURSORCLASS = 'DictCursor'  # Important: Makes cursor return dictionaries
 
+    # MySQL connection pool
+    MYSQL_POOL_MIN_SIZE = 2  # Connections opened up front per process
+    MYSQL_POOL_MAX_SIZE = 20  # Upper bound on open connections per process
+    MYSQL_POOL_MAX_LIFETIME = 1800  # Seconds before a connection is recycled
+    MYSQL_POOL_CHECKOUT_TIMEOUT = 10  # Seconds a request waits for a free connection
+    MYSQL_POOL_HEALTH_CHECK_IDLE = 30  # Ping connections idle longer than this before reuse
+
     # File upload configuration
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
     UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads')
+    SCREENSHOT_FOLDER = os.path.join(UPLOAD_FOLDER, 'screenshots')  # Content-addressed proctoring screenshots
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max upload
 
+    # Background screenshot thumbnailing and transcoding (needs Pillow)
+    SCREENSHOT_PIPELINE_ENABLED = True
+    SCREENSHOT_PIPELINE_WORKERS = 2  # Worker processes
+    SCREENSHOT_THUMBNAIL_SIZE = (320, 180)  # Bounding box of the thumbnails shown in the log viewer
+    SCREENSHOT_THUMBNAIL_QUALITY = 60  # JPEG quality of thumbnails
+    SCREENSHOT_ARCHIVE_QUALITY = 50  # JPEG quality of the recompressed archival copy
+    SCREENSHOT_ORIGINAL_RETENTION_HOURS = 24  # Originals are deleted this long after upload once archived
+    SCREENSHOT_PURGE_INTERVAL = 3600  # Seconds between purges of expired originals
+
+    # Near-duplicate screenshot suppression (needs Pillow)
+    SCREENSHOT_DEDUP_ENABLED = True
+    SCREENSHOT_DEDUP_MAX_DISTANCE = 6  # Max differing bits of the 64-bit dHash to count as the same frame
+    SCREENSHOT_DEDUP_WINDOW = 8  # Recent stored frames compared per session and log type
+    SCREENSHOT_DEDUP_WINDOW_SECONDS = 300  # Frames older than this are never referenced
+    SCREENSHOT_DEDUP_MAX_WINDOWS = 10000  # (session, log type) windows tracked per process
+
+    # Proctoring log write-behind queue
+    PROCTORING_WRITE_BEHIND = True
+    PROCTORING_QUEUE_SIZE = 10000  # Events buffered in memory before new ones are rejected
+    PROCTORING_FLUSH_BATCH_SIZE = 100  # Events written per group commit
+    PROCTORING_FLUSH_INTERVAL_MS = 200  # Maximum time an event waits before being flushed
+    PROCTORING_ENQUEUE_TIMEOUT_MS = 50  # How long a request blocks on a full queue
+    PROCTORING_FLUSH_RETRIES = 3  # Extra attempts at writing a batch the database rejected
+    PROCTORING_FLUSH_RETRY_BACKOFF_MS = 500  # Wait before the first retry, doubled for each one after
+
+    # Coalescing of repeated proctoring events into one row
+    PROCTORING_COALESCE_WINDOW_SECONDS = 30  # Max gap between repeats of a session's event type, 0 disables
+    PROCTORING_COALESCE_MAX_KEYS = 50000  # (session, event type) runs tracked per process
+
+    # Compiled answer key cache
+    ANSWER_KEY_CACHE_SIZE = 256  # Exams kept in memory
+    ANSWER_KEY_CACHE_TTL = 300  # Seconds before a key is reloaded from the database
+
+    # Serialized exam paper cache for take_exam
+    EXAM_PAPER_CACHE_SIZE = 256  # Exams kept in memory
+    EXAM_PAPER_CACHE_TTL = 300  # Seconds before a paper is reloaded from the database
+
+    # Results page item analysis cache
+    EXAM_STATS_CACHE_SIZE = 256  # Exams kept in memory
+    EXAM_STATS_CACHE_TTL = 300  # Seconds before other workers' submissions show up
+
+    # Flask-Login user cache
+    USER_CACHE_SIZE = 10000  # Users kept in memory
+    USER_CACHE_TTL = 60  # Seconds before a user is re-read from the database
+
+    # In-memory exam schedule index
+    EXAM_SCHEDULE_TTL = 60  # Seconds before the index is rebuilt from the exams table
+
+    # Admin listings (exams, results, proctoring logs) use keyset pagination
+    ADMIN_PAGE_SIZE = 50  # Rows per page
+
+    # Answer autosave during exams
+    ANSWER_AUTOSAVE_DELAY_MS = 2000  # Quiet period after an answer change before the changes are sent
+
+    # Asynchronous grading of submitted exams
+    GRADING_QUEUE_ENABLED = True  # Submit returns 202 and grading_jobs are graded in the background
+    GRADING_WORKERS = 2  # Grading threads per process
+    GRADING_CLAIM_BATCH_SIZE = 10  # Jobs a thread claims at a time
+    GRADING_POLL_INTERVAL_MS = 1000  # How often idle threads look for jobs queued by other processes
+    GRADING_MAX_ATTEMPTS = 3  # Attempts before a job is marked failed
+    GRADING_JOB_TIMEOUT = 300  # Seconds before a job left running by a dead worker is queued again
+
+    # Results export
+    EXPORT_CHUNK_SIZE = 1000  # Rows fetched per round trip from the server-side cursor
+
+    # Schema registry
+    SCHEMA_RECHECK_INTERVAL = 30  # Seconds between lookups of a missing table or column, picks up migrations without a restart
+
     # Session configuration
     PERMANENT_SESSION_LIFETIME = timedelta(days=1)
\ No newline at end of file
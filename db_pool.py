@@ -0,0 +1,282 @@
+from collections import deque
+import logging
+import os
+import threading
+import time
+
+import MySQLdb
+import MySQLdb.cursors
+from flask import current_app, g
+
+logger = logging.getLogger(__name__)
+
+class PoolTimeout(Exception):
+    """Raised when no connection became available within the checkout timeout"""
+    pass
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of MySQLdb connections.
+
+    Idle connections are handed out LIFO. Connections older than `max_lifetime`
+    are closed instead of reused, and connections idle for longer than
+    `health_check_idle` seconds are pinged before being handed out.
+    """
+
+    def __init__(self, connect, min_size=2, max_size=20, max_lifetime=1800,
+                 checkout_timeout=10, health_check_idle=30):
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.checkout_timeout = checkout_timeout
+        self.health_check_idle = health_check_idle
+        self._idle = deque()  # (connection, created_at, last_used)
+        self._created_at = {}  # id(connection) -> created_at for checked out connections
+        self._size = 0
+        self._pid = os.getpid()
+        self._condition = threading.Condition()
+        self._counters = {
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'created': 0,
+            'closed': 0,
+            'health_check_failures': 0
+        }
+
+    def _reset_after_fork(self):
+        # Sockets inherited from the parent process must not be shared, just forget them
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._idle.clear()
+            self._created_at.clear()
+            self._size = 0
+
+    def _open(self):
+        connection = self._connect()
+        with self._condition:
+            self._counters['created'] += 1
+        return connection
+
+    def _close(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._condition:
+            self._counters['closed'] += 1
+
+    def fill(self):
+        """
+        Open connections until the pool holds at least `min_size`
+        """
+        while True:
+            with self._condition:
+                self._reset_after_fork()
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                connection = self._open()
+            except Exception:
+                with self._condition:
+                    self._size -= 1
+                raise
+            now = time.monotonic()
+            with self._condition:
+                self._idle.append((connection, now, now))
+                self._condition.notify()
+
+    def checkout(self):
+        deadline = time.monotonic() + self.checkout_timeout
+        waited = False
+        while True:
+            with self._condition:
+                self._reset_after_fork()
+                entry = None
+                create = False
+                while entry is None and not create:
+                    if self._idle:
+                        entry = self._idle.pop()
+                    elif self._size < self.max_size:
+                        self._size += 1
+                        create = True
+                    else:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._counters['timeouts'] += 1
+                            raise PoolTimeout(f"No database connection available after {self.checkout_timeout}s")
+                        if not waited:
+                            self._counters['waits'] += 1
+                            waited = True
+                        self._condition.wait(remaining)
+
+            if create:
+                try:
+                    connection = self._open()
+                except Exception:
+                    with self._condition:
+                        self._size -= 1
+                        self._condition.notify()
+                    raise
+                created_at = time.monotonic()
+            else:
+                connection, created_at, last_used = entry
+                now = time.monotonic()
+                if now - created_at > self.max_lifetime:
+                    self._discard(connection)
+                    continue
+                if now - last_used > self.health_check_idle:
+                    try:
+                        connection.ping()
+                    except Exception as e:
+                        logger.warning(f"Discarding unhealthy pooled connection: {e}")
+                        with self._condition:
+                            self._counters['health_check_failures'] += 1
+                        self._discard(connection)
+                        continue
+
+            with self._condition:
+                self._counters['checkouts'] += 1
+                self._created_at[id(connection)] = created_at
+            return connection
+
+    def checkin(self, connection):
+        with self._condition:
+            if self._pid != os.getpid():
+                return
+            created_at = self._created_at.pop(id(connection), time.monotonic())
+
+        # End any open transaction so the next user starts from a clean snapshot
+        try:
+            connection.rollback()
+        except Exception as e:
+            logger.warning(f"Discarding pooled connection that failed to roll back: {e}")
+            self._discard(connection)
+            return
+
+        if time.monotonic() - created_at > self.max_lifetime:
+            self._discard(connection)
+            return
+
+        with self._condition:
+            self._idle.append((connection, created_at, time.monotonic()))
+            self._condition.notify()
+
+    def _discard(self, connection):
+        self._close(connection)
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+
+    def stats(self):
+        with self._condition:
+            stats = dict(self._counters)
+            stats['size'] = self._size
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = self._size - len(self._idle)
+            stats['min_size'] = self.min_size
+            stats['max_size'] = self.max_size
+        return stats
+
+
+class PooledMySQL:
+    """
+    Drop-in replacement for flask_mysqldb.MySQL backed by a ConnectionPool.
+
+    `mysql.connection` checks a connection out of the pool on first use in an
+    application context, and the connection goes back to the pool when the
+    context is torn down.
+    """
+
+    def __init__(self, app=None):
+        self._pools = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('MYSQL_HOST', 'localhost')
+        app.config.setdefault('MYSQL_USER', None)
+        app.config.setdefault('MYSQL_PASSWORD', None)
+        app.config.setdefault('MYSQL_DB', None)
+        app.config.setdefault('MYSQL_PORT', 3306)
+        app.config.setdefault('MYSQL_UNIX_SOCKET', None)
+        app.config.setdefault('MYSQL_CONNECT_TIMEOUT', 10)
+        app.config.setdefault('MYSQL_CHARSET', 'utf8')
+        app.config.setdefault('MYSQL_USE_UNICODE', True)
+        app.config.setdefault('MYSQL_SQL_MODE', None)
+        app.config.setdefault('MYSQL_CURSORCLASS', None)
+        app.config.setdefault('MYSQL_AUTOCOMMIT', False)
+        app.config.setdefault('MYSQL_POOL_MIN_SIZE', 2)
+        app.config.setdefault('MYSQL_POOL_MAX_SIZE', 20)
+        app.config.setdefault('MYSQL_POOL_MAX_LIFETIME', 1800)
+        app.config.setdefault('MYSQL_POOL_CHECKOUT_TIMEOUT', 10)
+        app.config.setdefault('MYSQL_POOL_HEALTH_CHECK_IDLE', 30)
+
+        if hasattr(app, 'teardown_appcontext'):
+            app.teardown_appcontext(self.teardown)
+
+    @staticmethod
+    def _connect_kwargs(config):
+        kwargs = {
+            'host': config['MYSQL_HOST'],
+            'port': config['MYSQL_PORT'],
+            'connect_timeout': config['MYSQL_CONNECT_TIMEOUT'],
+            'charset': config['MYSQL_CHARSET'],
+            'use_unicode': config['MYSQL_USE_UNICODE'],
+            'autocommit': config['MYSQL_AUTOCOMMIT']
+        }
+        if config['MYSQL_USER']:
+            kwargs['user'] = config['MYSQL_USER']
+        if config['MYSQL_PASSWORD']:
+            kwargs['passwd'] = config['MYSQL_PASSWORD']
+        if config['MYSQL_DB']:
+            kwargs['db'] = config['MYSQL_DB']
+        if config['MYSQL_UNIX_SOCKET']:
+            kwargs['unix_socket'] = config['MYSQL_UNIX_SOCKET']
+        if config['MYSQL_SQL_MODE']:
+            kwargs['sql_mode'] = config['MYSQL_SQL_MODE']
+        if config['MYSQL_CURSORCLASS']:
+            kwargs['cursorclass'] = getattr(MySQLdb.cursors, config['MYSQL_CURSORCLASS'])
+        return kwargs
+
+    def get_pool(self, app=None):
+        app = app or current_app._get_current_object()
+        pool = self._pools.get(app)
+        if pool is None:
+            with self._lock:
+                pool = self._pools.get(app)
+                if pool is None:
+                    config = app.config
+                    kwargs = self._connect_kwargs(config)
+                    pool = ConnectionPool(
+                        lambda: MySQLdb.connect(**kwargs),
+                        min_size=config.get('MYSQL_POOL_MIN_SIZE', 2),
+                        max_size=config.get('MYSQL_POOL_MAX_SIZE', 20),
+                        max_lifetime=config.get('MYSQL_POOL_MAX_LIFETIME', 1800),
+                        checkout_timeout=config.get('MYSQL_POOL_CHECKOUT_TIMEOUT', 10),
+                        health_check_idle=config.get('MYSQL_POOL_HEALTH_CHECK_IDLE', 30)
+                    )
+                    self._pools[app] = pool
+                    try:
+                        pool.fill()
+                    except Exception as e:
+                        logger.error(f"Could not pre-open pooled connections: {e}")
+        return pool
+
+    @property
+    def connection(self):
+        if 'mysql_db' not in g:
+            g.mysql_db = self.get_pool().checkout()
+        return g.mysql_db
+
+    def teardown(self, exception):
+        connection = g.pop('mysql_db', None)
+        if connection is not None:
+            self.get_pool().checkin(connection)
+
+    def stats(self):
+        return self.get_pool().stats()
@@ -1,7 +1,7 @@
-from flask_mysqldb import MySQL
 from flask_login import LoginManager
+from db_pool import PooledMySQL
 
 # Initialize extensions
-mysql = MySQL()
+mysql = PooledMySQL()  # Same interface as flask_mysqldb.MySQL, backed by a connection pool
 login_manager = LoginManager()
 login_manager.login_view = 'auth.login'
\ No newline at end of file
@@ -0,0 +1,123 @@
+from extensions import mysql
+from models.grading import GradingEngine, answer_key_cache
+from models.schema import schema_registry
+
+class AnswerDraft:
+    """
+    Answers autosaved while an exam is in progress, one row per
+    (session_id, question_id).
+
+    The client sends only the answers changed since its last autosave, which
+    are upserted with one multi-row statement. On submit the drafts are read
+    back, overlaid with whatever the client hadn't saved yet, graded and
+    removed, so the final request carries little more than the session id.
+    """
+
+    @staticmethod
+    def is_available():
+        return schema_registry.has_table('answer_drafts')
+
+    @staticmethod
+    def save(session_id, student_id, changes):
+        """
+        Upsert the changed answers of one of the student's in-progress sessions.
+
+        `changes` maps question ids to an option, or to None/'' to clear the answer.
+        Returns the number of answers written, raises ValueError if the session
+        isn't the student's or is no longer in progress.
+        """
+        cursor = mysql.connection.cursor()
+        try:
+            # Shared lock, so a save can't land between submit reading and deleting the drafts
+            cursor.execute("""
+                SELECT exam_id FROM exam_sessions
+                WHERE id = %s AND student_id = %s AND status = 'in_progress'
+                LOCK IN SHARE MODE
+            """, (session_id, student_id))
+            session = cursor.fetchone()
+            if not session:
+                raise ValueError("Invalid or already completed session")
+
+            answer_key = answer_key_cache.get(session['exam_id'])
+            upserts, cleared = AnswerDraft.split_changes(answer_key, changes)
+
+            if upserts:
+                values_sql = ', '.join(['(%s, %s, %s)'] * len(upserts))
+                params = []
+                for question_id, selected_option in upserts.items():
+                    params.extend((session_id, question_id, selected_option))
+                cursor.execute(f"""
+                    INSERT INTO answer_drafts (session_id, question_id, selected_option)
+                    VALUES {values_sql}
+                    ON DUPLICATE KEY UPDATE selected_option = VALUES(selected_option)
+                """, params)
+            if cleared:
+                placeholders = ', '.join(['%s'] * len(cleared))
+                cursor.execute(f"""
+                    DELETE FROM answer_drafts
+                    WHERE session_id = %s AND question_id IN ({placeholders})
+                """, [session_id] + cleared)
+
+            mysql.connection.commit()
+            return len(upserts) + len(cleared)
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def split_changes(answer_key, changes):
+        """
+        Split {question_id: option} changes into normalized upserts and the
+        question ids to clear, ignoring ids that aren't questions of the exam
+        """
+        upserts = {}
+        cleared = []
+        for question_id, selected_option in (changes or {}).items():
+            try:
+                question_id = int(str(question_id).replace('question_', ''))
+            except (TypeError, ValueError):
+                continue
+            if answer_key.position(question_id) is None:
+                continue
+            selected_option = GradingEngine.normalize_option(selected_option)
+            if not selected_option:
+                cleared.append(question_id)
+            elif len(selected_option) == 1:
+                # Option codes are stored as CHAR(1) like student_answers.selected_option
+                upserts[question_id] = selected_option
+        return upserts, cleared
+
+    @staticmethod
+    def get(session_id, cursor=None):
+        """
+        {question_id: option code} of the session's saved drafts
+        """
+        if not AnswerDraft.is_available():
+            return {}
+        own_cursor = cursor is None
+        if own_cursor:
+            cursor = mysql.connection.cursor()
+        cursor.execute("SELECT question_id, selected_option FROM answer_drafts WHERE session_id = %s", (session_id,))
+        drafts = {row['question_id']: row['selected_option'] for row in cursor.fetchall()}
+        if own_cursor:
+            cursor.close()
+        return drafts
+
+    @staticmethod
+    def merge(answer_key, drafts, answers):
+        """
+        Overlay the submitted answers on the drafts, both keyed by question id
+        """
+        upserts, cleared = AnswerDraft.split_changes(answer_key, answers)
+        merged = dict(drafts)
+        merged.update(upserts)
+        for question_id in cleared:
+            merged.pop(question_id, None)
+        return merged
+
+    @staticmethod
+    def delete(cursor, session_id):
+        """
+        Drop the session's drafts on the caller's transaction, once they are graded
+        """
+        if AnswerDraft.is_available():
+            cursor.execute("DELETE FROM answer_drafts WHERE session_id = %s", (session_id,))
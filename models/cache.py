@@ -0,0 +1,130 @@
+from collections import Counter, OrderedDict
+import threading
+import time
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries also expire after `ttl` seconds
+    """
+
+    def __init__(self, max_size=1024, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, max_size=None, ttl=None):
+        with self._lock:
+            if max_size is not None:
+                self.max_size = max_size
+            if ttl is not None:
+                self.ttl = ttl
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get(self, key):
+        """
+        Return the cached value, or None on a miss or expired entry
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, stored_at = entry
+                if time.monotonic() - stored_at < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 3) if total else 0
+            }
+
+
+class VersionedCache(TTLCache):
+    """
+    TTLCache of values built by `loader(key, version)`, entries keyed by (key, version).
+
+    `version_of(key)` reads the version from where the data lives, e.g. a
+    counter the database bumps with every change, so each get() sees changes
+    made by any process. It may return None when no version is stored, and
+    then only invalidate() calls of this process and the TTL retire entries.
+    A value loaded while the same key was invalidated isn't cached. The
+    invalidations recorded for that check are pruned once no load that
+    started before them is still running, so they stay bounded.
+    """
+
+    def __init__(self, loader, version_of=None, key_type=None, max_size=256, ttl=300):
+        super().__init__(max_size=max_size, ttl=ttl)
+        self.loader = loader
+        self.version_of = version_of
+        self.key_type = key_type
+        self._generation = 0
+        self._invalidated = {}
+        self._loads = Counter()
+
+    def get(self, key):
+        if self.key_type is not None:
+            key = self.key_type(key)
+        version = self.version_of(key) if self.version_of is not None else None
+        value = super().get((key, version))
+        if value is not None:
+            return value
+
+        with self._lock:
+            started = self._generation
+            self._loads[started] += 1
+        try:
+            value = self.loader(key, version)
+        finally:
+            with self._lock:
+                self._loads[started] -= 1
+                if not self._loads[started]:
+                    del self._loads[started]
+                if self._invalidated.get(key, 0) <= started:
+                    self.set((key, version), value)
+                self._prune()
+        return value
+
+    def invalidate(self, key):
+        if self.key_type is not None:
+            key = self.key_type(key)
+        with self._lock:
+            self._generation += 1
+            self._invalidated[key] = self._generation
+            for cache_key in [cache_key for cache_key in self._entries if cache_key[0] == key]:
+                del self._entries[cache_key]
+            self._prune()
+
+    def _prune(self):
+        # Only loads that started before an invalidation need to see it
+        oldest_load = min(self._loads) if self._loads else self._generation
+        if len(self._invalidated) > self.max_size:
+            self._invalidated = {key: generation for key, generation in self._invalidated.items()
+                                 if generation > oldest_load}
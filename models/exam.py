@@ -1,7 +1,10 @@
 from flask import current_app
 from datetime import datetime
+from models.row_mapper import make_row_mapper
 
 class Exam:
+    __slots__ = ('id', 'title', 'description', 'duration', 'start_time', 'end_time', 'created_by')
+
     def __init__(self, id, title, description, duration, start_time, end_time, created_by):
         self.id = id
         self.title = title
@@ -20,63 +23,74 @@ class Exam:
         cursor.close()
         
         if exam_data:
-            return Exam(
-                id=exam_data['id'],
-                title=exam_data['title'],
-                description=exam_data['description'],
-                duration=exam_data['duration'],
-                start_time=exam_data['start_time'],
-                end_time=exam_data['end_time'],
-                created_by=exam_data['created_by']
-            )
+            return Exam.from_row(exam_data)
         return None
     
     @staticmethod
-    def get_all_exams():
+    def get_all_exams(limit=None, after=None):
+        """
+        Exams newest first. With `limit`, returns at most that many exams created
+        before the exam id `after` (keyset pagination on the primary key).
+        """
         from extensions import mysql
+        where = ""
+        params = []
+        if after is not None:
+            where = "WHERE id < %s"
+            params.append(after)
+        limit_sql = ""
+        if limit is not None:
+            limit_sql = "LIMIT %s"
+            params.append(limit)
+        
+        # Ids grow with creation time, so this is the created_at order without a sort
         cursor = mysql.connection.cursor()
-        cursor.execute("SELECT * FROM exams ORDER BY created_at DESC")
+        cursor.execute(f"SELECT * FROM exams {where} ORDER BY id DESC {limit_sql}", params)
         exams_data = cursor.fetchall()
         cursor.close()
         
-        exams = []
-        for exam_data in exams_data:
-            exams.append(Exam(
-                id=exam_data['id'],
-                title=exam_data['title'],
-                description=exam_data['description'],
-                duration=exam_data['duration'],
-                start_time=exam_data['start_time'],
-                end_time=exam_data['end_time'],
-                created_by=exam_data['created_by']
-            ))
-        return exams
+        return [Exam.from_row(exam_data) for exam_data in exams_data]
     
     @staticmethod
     def get_active_exams():
+        # Answered from the in-memory schedule index instead of querying per request
+        from models.exam_schedule import exam_schedule
+        return exam_schedule.get_active(datetime.now())
+    
+    @staticmethod
+    def get_upcoming_exams():
+        from models.exam_schedule import exam_schedule
+        return exam_schedule.get_upcoming(datetime.now())
+    
+    @staticmethod
+    def count_upcoming_exams():
+        from models.exam_schedule import exam_schedule
+        return exam_schedule.count_upcoming(datetime.now())
+    
+    @staticmethod
+    def get_question_version(exam_id):
+        """
+        Counter bumped by every question change of the exam, None for an unknown
+        exam or before the question_version column has been migrated
+        """
         from extensions import mysql
-        now = datetime.now()
+        from models.schema import schema_registry
+        if not schema_registry.has_column('exams', 'question_version'):
+            return None
         cursor = mysql.connection.cursor()
-        cursor.execute("""
-            SELECT * FROM exams 
-            WHERE start_time <= %s AND end_time >= %s
-            ORDER BY start_time
-        """, (now, now))
-        exams_data = cursor.fetchall()
+        cursor.execute("SELECT question_version FROM exams WHERE id = %s", (exam_id,))
+        row = cursor.fetchone()
         cursor.close()
-        
-        exams = []
-        for exam_data in exams_data:
-            exams.append(Exam(
-                id=exam_data['id'],
-                title=exam_data['title'],
-                description=exam_data['description'],
-                duration=exam_data['duration'],
-                start_time=exam_data['start_time'],
-                end_time=exam_data['end_time'],
-                created_by=exam_data['created_by']
-            ))
-        return exams
+        return row['question_version'] if row else None
+    
+    @staticmethod
+    def bump_question_version(cursor, exam_id):
+        """
+        Record a question change on the caller's transaction, so every process drops its cached key and paper
+        """
+        from models.schema import schema_registry
+        if schema_registry.has_column('exams', 'question_version', fresh=True):
+            cursor.execute("UPDATE exams SET question_version = question_version + 1 WHERE id = %s", (exam_id,))
     
     @staticmethod
     def create_exam(title, description, duration, start_time, end_time, created_by):
@@ -89,4 +103,10 @@ class Exam:
         exam_id = cursor.lastrowid
         mysql.connection.commit()
         cursor.close()
-        return exam_id
\ No newline at end of file
+        
+        from models.exam_schedule import exam_schedule
+        exam_schedule.invalidate()
+        return exam_id
+
+
+Exam.from_row = staticmethod(make_row_mapper(Exam, Exam.__slots__))
@@ -0,0 +1,38 @@
+from jinja2.utils import htmlsafe_json_dumps
+
+from models.cache import VersionedCache
+from models.exam import Exam
+
+# Only these columns are sent to students, correct_option and marks never leave the server
+PAPER_FIELDS = ('id', 'exam_id', 'question_text', 'option_a', 'option_b', 'option_c', 'option_d')
+
+class ExamPaper:
+    """
+    Student-facing question list of one exam version, serialized once.
+
+    `questions` is what take_exam.html iterates over and `questions_json` is
+    the same list already encoded for embedding in the page script.
+    """
+    __slots__ = ('exam_id', 'version', 'questions', 'questions_json')
+
+    def __init__(self, exam_id, version, rows):
+        self.exam_id = exam_id
+        self.version = version
+        self.questions = tuple({field: row[field] for field in PAPER_FIELDS} for row in rows)
+        self.questions_json = htmlsafe_json_dumps(list(self.questions))
+
+    def __len__(self):
+        return len(self.questions)
+
+    @staticmethod
+    def load(exam_id, version=None):
+        from extensions import mysql
+        cursor = mysql.connection.cursor()
+        cursor.execute(f"SELECT {', '.join(PAPER_FIELDS)} FROM questions WHERE exam_id = %s ORDER BY id", (exam_id,))
+        rows = cursor.fetchall()
+        cursor.close()
+        return ExamPaper(exam_id, version, rows)
+
+
+# Shared exam paper cache, configured in create_app and versioned like the answer key
+exam_paper_cache = VersionedCache(ExamPaper.load, version_of=Exam.get_question_version, key_type=int)
@@ -0,0 +1,109 @@
+from bisect import bisect_right
+from datetime import datetime
+import threading
+import time
+
+class ScheduleSnapshot:
+    """
+    Immutable sorted interval structure over exam (start_time, end_time).
+
+    All distinct start/end times are kept as sorted boundary points. A sweep
+    over them precomputes the exams active exactly at each point and in the
+    gap after it, so "active at t" is one binary search.
+    """
+
+    def __init__(self, exams):
+        self.exams = sorted(exams, key=lambda exam: (exam.start_time, exam.id))
+        self.starts = [exam.start_time for exam in self.exams]
+
+        starts_at = {}
+        ends_at = {}
+        for exam in self.exams:
+            starts_at.setdefault(exam.start_time, []).append(exam)
+            ends_at.setdefault(exam.end_time, []).append(exam)
+        self.points = sorted(set(starts_at) | set(ends_at))
+
+        self.point_sets = []
+        self.gap_sets = []
+        active = {}
+        for point in self.points:
+            for exam in starts_at.get(point, ()):
+                active[exam.id] = exam
+            # Active at the point itself: start <= point <= end
+            self.point_sets.append(self._ordered(active))
+            for exam in ends_at.get(point, ()):
+                active.pop(exam.id, None)
+            # Active strictly between this point and the next one
+            self.gap_sets.append(self._ordered(active))
+
+    @staticmethod
+    def _ordered(active):
+        return tuple(sorted(active.values(), key=lambda exam: (exam.start_time, exam.id)))
+
+    def active_at(self, moment):
+        index = bisect_right(self.points, moment) - 1
+        if index < 0:
+            return ()
+        if self.points[index] == moment:
+            return self.point_sets[index]
+        return self.gap_sets[index]
+
+    def upcoming_at(self, moment):
+        return self.exams[bisect_right(self.starts, moment):]
+
+    def count_upcoming_at(self, moment):
+        return len(self.exams) - bisect_right(self.starts, moment)
+
+
+class ExamScheduleIndex:
+    """
+    Process-wide schedule index rebuilt from the exams table on a short TTL
+    and whenever an exam is created.
+    """
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._snapshot = None
+        self._built_at = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.ttl = app.config.get('EXAM_SCHEDULE_TTL', self.ttl)
+
+    def invalidate(self):
+        self._generation += 1
+        self._built_at = 0
+
+    def _load(self):
+        from extensions import mysql
+        from models.exam import Exam
+        cursor = mysql.connection.cursor()
+        cursor.execute("SELECT * FROM exams")
+        exams_data = cursor.fetchall()
+        cursor.close()
+        return ScheduleSnapshot(Exam.from_row(exam_data) for exam_data in exams_data)
+
+    def snapshot(self):
+        if self._snapshot is None or time.monotonic() - self._built_at >= self.ttl:
+            with self._lock:
+                if self._snapshot is None or time.monotonic() - self._built_at >= self.ttl:
+                    generation = self._generation
+                    self._snapshot = self._load()
+                    # An exam created while loading leaves the snapshot stale for the next call
+                    if generation == self._generation:
+                        self._built_at = time.monotonic()
+        return self._snapshot
+
+    def get_active(self, moment=None):
+        return list(self.snapshot().active_at(moment or datetime.now()))
+
+    def get_upcoming(self, moment=None):
+        return list(self.snapshot().upcoming_at(moment or datetime.now()))
+
+    def count_upcoming(self, moment=None):
+        return self.snapshot().count_upcoming_at(moment or datetime.now())
+
+
+# Shared schedule index, configured in create_app
+exam_schedule = ExamScheduleIndex()
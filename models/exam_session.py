@@ -1,8 +1,20 @@
 from datetime import datetime
 from extensions import mysql
+from models.answer_draft import AnswerDraft
+from models.exam_stats import ExamStatistics
+from models.exam_stats_rollup import ExamStatsRollup
+from models.grading import GradingEngine, answer_key_cache
+from models.row_mapper import make_row_mapper
+from models.student_summary import StudentSummary
 
 class ExamSession:
-    def __init__(self, id, student_id, exam_id, start_time, end_time=None, status='in_progress', score=None):
+    FIELDS = ('id', 'student_id', 'exam_id', 'start_time', 'end_time', 'status', 'score')
+    # Filled from joined columns when the query selects them
+    OPTIONAL_FIELDS = ('student_name', 'student_email', 'exam_title')
+    __slots__ = FIELDS + OPTIONAL_FIELDS
+
+    def __init__(self, id, student_id, exam_id, start_time, end_time=None, status='in_progress', score=None,
+                 student_name=None, student_email=None, exam_title=None):
         self.id = id
         self.student_id = student_id
         self.exam_id = exam_id
@@ -10,13 +22,16 @@ class ExamSession:
         self.end_time = end_time
         self.status = status
         self.score = score
+        self.student_name = student_name
+        self.student_email = student_email
+        self.exam_title = exam_title
     
     @staticmethod
     def get_by_id(session_id):
         from extensions import mysql
         cursor = mysql.connection.cursor()
         cursor.execute("""
-            SELECT es.*, u.username, u.email 
+            SELECT es.*, u.username AS student_name, u.email AS student_email
             FROM exam_sessions es
             JOIN users u ON es.student_id = u.id
             WHERE es.id = %s
@@ -25,21 +40,7 @@ class ExamSession:
         cursor.close()
         
         if session_data:
-            session = ExamSession(
-                id=session_data['id'],
-                student_id=session_data['student_id'],
-                exam_id=session_data['exam_id'],
-                start_time=session_data['start_time'],
-                end_time=session_data['end_time'],
-                status=session_data['status'],
-                score=session_data['score']
-            )
-            
-            # Add additional fields directly to the session object
-            session.student_name = session_data['username']
-            session.student_email = session_data['email']
-            
-            return session
+            return ExamSession.from_row(session_data)
         return None
     
     
@@ -67,15 +68,7 @@ class ExamSession:
         cursor.close()
         
         if session_data:
-            return ExamSession(
-                id=session_data['id'],
-                student_id=session_data['student_id'],
-                exam_id=session_data['exam_id'],
-                start_time=session_data['start_time'],
-                end_time=session_data['end_time'],
-                status=session_data['status'],
-                score=session_data['score']
-            )
+            return ExamSession.from_row(session_data)
         return None
     
     @staticmethod
@@ -105,103 +98,126 @@ class ExamSession:
         cursor.close()
         
         if session_data:
-            return ExamSession(
-                id=session_data['id'],
-                student_id=session_data['student_id'],
-                exam_id=session_data['exam_id'],
-                start_time=session_data['start_time'],
-                end_time=session_data['end_time'],
-                status=session_data['status'],
-                score=session_data['score']
-            )
+            return ExamSession.from_row(session_data)
         return None
     
     @staticmethod
     def submit_answers(session_id, answers):
-        """Submit student answers and calculate the score"""
+        """
+        Submit student answers and calculate the score.
+        
+        The answers graded are the session's autosaved drafts overlaid with
+        `answers`, which only needs to hold what the client hadn't autosaved.
+        """
         from flask import current_app
         
-        # Verify session exists and is active
+        # Verify session exists and is active, locked so concurrent autosaves wait for the submit
         cursor = mysql.connection.cursor()
-        cursor.execute("SELECT * FROM exam_sessions WHERE id = %s", (session_id,))
+        cursor.execute("SELECT * FROM exam_sessions WHERE id = %s FOR UPDATE", (session_id,))
         session = cursor.fetchone()
         
         if not session or session['status'] != 'in_progress':
             current_app.logger.error(f"Invalid session for submission: {session_id}")
             raise ValueError("Invalid or already completed session")
         
-        # Get all questions for this exam
+        percentage_score = ExamSession.grade_session(cursor, session, answers, datetime.now())
+        
+        mysql.connection.commit()
+        cursor.close()
+        
+        # The exam's cached results statistics no longer include every submission
+        ExamStatistics.invalidate(session['exam_id'])
+        
+        return percentage_score
+    
+    @staticmethod
+    def grade_submission(cursor, session_id, answers):
+        """
+        Grade a session queued by GradingQueue.enqueue on the caller's transaction.
+        
+        The session was marked 'submitted' with its end time when the answers
+        were received. Returns the percentage score, also for a session a
+        previous attempt already completed.
+        """
+        cursor.execute("SELECT * FROM exam_sessions WHERE id = %s FOR UPDATE", (session_id,))
+        session = cursor.fetchone()
+        if not session:
+            raise ValueError(f"Session {session_id} no longer exists")
+        
+        if session['status'] == 'completed':
+            total_marks = answer_key_cache.get(session['exam_id']).total_marks
+            return (session['score'] or 0) / total_marks * 100 if total_marks > 0 else 0
+        if session['status'] != 'submitted':
+            raise ValueError(f"Session {session_id} is {session['status']}, not submitted")
+        
+        return ExamSession.grade_session(cursor, session, answers, session['end_time'] or datetime.now())
+    
+    @staticmethod
+    def grade_session(cursor, session, answers, end_time):
+        """
+        Score a locked session row, save its answers and mark it completed at
+        `end_time`, on the caller's transaction. Returns the percentage score.
+        """
+        from flask import current_app
+        
+        session_id = session['id']
+        
+        # Get the compiled answer key for this exam
         exam_id = session['exam_id']
-        cursor.execute("SELECT * FROM questions WHERE exam_id = %s", (exam_id,))
-        questions = cursor.fetchall()
+        answer_key = answer_key_cache.get(exam_id)
         
-        if not questions:
+        if not len(answer_key):
             current_app.logger.error(f"No questions found for exam_id: {exam_id}")
             raise ValueError("No questions found for this exam")
         
-        # Calculate score
-        total_marks = 0
-        obtained_marks = 0
-        
-        # Process each answer
-        for question in questions:
-            question_id = str(question['id'])
-            total_marks += question['marks']
-            
-            # Check if student answered this question
-            if question_id in answers:
-                selected_option = answers[question_id]
-                
-                # Debug logging
-                current_app.logger.info(f"Processing answer for question {question_id}: selected={selected_option}, correct={question['correct_option']}")
-                
-                # Ensure consistent comparison by normalizing format
-                # Convert both to same format for comparison (lowercase single character)
-                correct_option = question['correct_option'].lower()
-                if correct_option.startswith('option_'):
-                    correct_option = correct_option[-1]  # Extract the last character (a, b, c, d)
-                    
-                selected_normalized = selected_option.lower()
-                if selected_normalized.startswith('option_'):
-                    selected_normalized = selected_normalized[-1]
-                    
-                is_correct = (selected_normalized == correct_option)
-                
-                # Debug logging
-                current_app.logger.info(f"Normalized comparison: selected={selected_normalized}, correct={correct_option}, is_correct={is_correct}")
-                
-                if is_correct:
-                    obtained_marks += question['marks']
-                
-                # Save student's answer with the original format
-                cursor.execute("""
-                    INSERT INTO student_answers 
-                    (session_id, question_id, selected_option, is_correct)
-                    VALUES (%s, %s, %s, %s)
-                """, (session_id, question_id, selected_option, is_correct))
-        
-        # Calculate percentage
-        percentage_score = (obtained_marks / total_marks) * 100 if total_marks > 0 else 0
+        # Drafts are stored normalized, score in a single pass, save every answer with one INSERT
+        drafts = AnswerDraft.get(session_id, cursor)
+        result = GradingEngine.grade(answer_key, AnswerDraft.merge(answer_key, drafts, answers))
+        GradingEngine.save_answers(cursor, session_id, result.answer_rows)
+        AnswerDraft.delete(cursor, session_id)
+        
+        obtained_marks = result.obtained_marks
+        total_marks = result.total_marks
+        percentage_score = result.percentage
+        current_app.logger.debug(f"Graded session {session_id}: {len(result.answer_rows)} answers ({len(drafts)} autosaved), "
+                                 f"{obtained_marks}/{total_marks}")
         
         # Update session as completed
-        now = datetime.now()
         cursor.execute("""
             UPDATE exam_sessions 
             SET status = 'completed', end_time = %s, score = %s
             WHERE id = %s
-        """, (now, obtained_marks, session_id))  # Store raw score instead of percentage
+        """, (end_time, obtained_marks, session_id))  # Store raw score instead of percentage
+        
+        # Keep the student's dashboard summary in step with this session
+        StudentSummary.record_completion(cursor, session['student_id'], obtained_marks, end_time)
+        ExamStatsRollup.record_completion(cursor, exam_id, obtained_marks, total_marks)
         
         # Log exam completion
         score_message = f"Score: {obtained_marks}/{total_marks} ({percentage_score:.1f}%)"
         cursor.execute("""
             INSERT INTO proctoring_logs (session_id, log_type, details, timestamp)
             VALUES (%s, %s, %s, %s)
-        """, (session_id, 'exam_end', score_message, now))
+        """, (session_id, 'exam_end', score_message, end_time))
         
-        mysql.connection.commit()
+        return percentage_score
+    
+    @staticmethod
+    def get_in_progress_ids(student_id, session_ids):
+        """Return the subset of session_ids that are the student's sessions in progress"""
+        session_ids = sorted(set(session_ids))
+        if not session_ids:
+            return set()
+        placeholders = ', '.join(['%s'] * len(session_ids))
+        cursor = mysql.connection.cursor()
+        cursor.execute(f"""
+            SELECT id FROM exam_sessions
+            WHERE id IN ({placeholders}) AND student_id = %s AND status = 'in_progress'
+        """, (*session_ids, student_id))
+        rows = cursor.fetchall()
         cursor.close()
         
-        return percentage_score
+        return {row['id'] for row in rows}
     
     @staticmethod
     def get_student_sessions(student_id):
@@ -239,17 +255,64 @@ class ExamSession:
         return sessions_data
     
     @staticmethod
-    def get_results_by_exam(exam_id):
-        """Get all exam session results for a specific exam"""
+    def get_results_by_exam(exam_id, limit=None, after=None):
+        """
+        Get exam session results for a specific exam, best score first.
+        
+        With `limit`, returns at most that many rows following the (score, id) key
+        `after`. The order matches idx_sessions_exam_status_score, whose entries
+        end with the primary key, so each page is a short index range scan.
+        """
+        where = ""
+        params = [exam_id]
+        if after is not None:
+            where = "AND (es.score < %s OR (es.score = %s AND es.id < %s))"
+            params.extend((after[0], after[0], after[1]))
+        limit_sql = ""
+        if limit is not None:
+            limit_sql = "LIMIT %s"
+            params.append(limit)
+        
         cursor = mysql.connection.cursor()
-        cursor.execute("""
+        cursor.execute(f"""
             SELECT es.*, u.username as student_name
             FROM exam_sessions es
             JOIN users u ON es.student_id = u.id
-            WHERE es.exam_id = %s AND es.status = 'completed'
-            ORDER BY es.score DESC
-        """, (exam_id,))
+            WHERE es.exam_id = %s AND es.status = 'completed' {where}
+            ORDER BY es.score DESC, es.id DESC
+            {limit_sql}
+        """, params)
         results = cursor.fetchall()
         cursor.close()
     
-        return results
\ No newline at end of file
+        return results
+    
+    @staticmethod
+    def iter_results_by_exam(exam_id, chunk_size=1000):
+        """
+        Yield the completed sessions of an exam in chunks of at most `chunk_size` rows.
+        
+        Uses a server-side cursor so the result set is streamed from MySQL instead of
+        being buffered in memory. No other query may run on the connection until the
+        generator is exhausted or closed.
+        """
+        import MySQLdb.cursors
+        cursor = mysql.connection.cursor(MySQLdb.cursors.SSDictCursor)
+        try:
+            cursor.execute("""
+                SELECT u.username as student_name, es.start_time, es.end_time, es.score
+                FROM exam_sessions es
+                JOIN users u ON es.student_id = u.id
+                WHERE es.exam_id = %s AND es.status = 'completed'
+                ORDER BY es.score DESC
+            """, (exam_id,))
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cursor.close()
+
+
+ExamSession.from_row = staticmethod(make_row_mapper(ExamSession, ExamSession.FIELDS, ExamSession.OPTIONAL_FIELDS))
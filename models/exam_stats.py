@@ -0,0 +1,239 @@
+import numpy as np
+
+from extensions import mysql
+from models.cache import TTLCache
+from models.exam_paper import exam_paper_cache
+from models.exam_stats_rollup import HISTOGRAM_BUCKETS, PASS_PERCENTAGE, ExamStatsRollup
+from models.grading import GradingEngine, answer_key_cache
+
+# Share of candidates in each of the upper and lower groups of the discrimination index
+DISCRIMINATION_GROUP_RATIO = 0.27
+
+OPTIONS = ('a', 'b', 'c', 'd')
+
+# Per-exam item analysis with the fingerprint of the results it was computed from
+exam_stats_cache = TTLCache(max_size=256, ttl=300)
+
+class ExamStatistics:
+    """
+    Results page statistics computed with SQL aggregates.
+
+    The summary is read on every request from the exam_stats rollup, one row
+    by primary key, or from one aggregate over exam_sessions before that
+    table has been migrated. Item analysis comes from one GROUP BY over
+    student_answers plus the correct answer counts of the top and bottom
+    scoring candidates, and is cached per exam. A cached analysis is only
+    used while the summary just read and the answer key version still match
+    the ones it was computed with, so submissions and question changes made
+    by any process show up on the next request. Marks, correct options and
+    question texts come from the cached answer key and paper, so the
+    questions table isn't read at all.
+    """
+
+    @staticmethod
+    def total_marks(exam_id):
+        return answer_key_cache.get(exam_id).total_marks
+
+    @staticmethod
+    def fingerprint(answer_key, summary):
+        """
+        Values that change whenever the exam's questions or completed sessions do
+        """
+        return (
+            answer_key.version,
+            summary['total_students'],
+            summary['average_score'],
+            summary['std_dev'],
+            summary['min_score'],
+            summary['max_score']
+        )
+
+    @staticmethod
+    def get(exam_id):
+        """
+        Return {'total_marks', 'summary', 'questions'} for an exam, the item analysis from the cache when possible
+        """
+        exam_id = int(exam_id)
+        answer_key = answer_key_cache.get(exam_id)
+        total_marks = answer_key.total_marks
+        summary = ExamStatistics.summary(exam_id, total_marks)
+        fingerprint = ExamStatistics.fingerprint(answer_key, summary)
+
+        cached = exam_stats_cache.get(exam_id)
+        if cached is not None and cached[0] == fingerprint:
+            questions = cached[1]
+        else:
+            questions = ExamStatistics.item_analysis(exam_id, answer_key)
+            exam_stats_cache.set(exam_id, (fingerprint, questions))
+        return {'total_marks': total_marks, 'summary': summary, 'questions': questions}
+
+    @staticmethod
+    def invalidate(exam_id):
+        exam_stats_cache.delete(int(exam_id))
+
+    @staticmethod
+    def summary(exam_id, total_marks):
+        if ExamStatsRollup.is_available():
+            rollup = ExamStatsRollup.get(exam_id, total_marks)
+            return {
+                'total_students': rollup.completed_count,
+                'average_score': rollup.average_score,
+                'std_dev': rollup.std_dev,
+                'min_score': rollup.min_score,
+                'max_score': rollup.max_score,
+                'passed_students': rollup.pass_count,
+                'pass_rate': rollup.pass_rate,
+                'histogram': ExamStatistics.histogram_labels(rollup.histogram)
+            }
+
+        cursor = mysql.connection.cursor()
+        # Integer comparison, so 7/10 is a pass exactly as score / total >= 0.7 would be
+        cursor.execute("""
+            SELECT COUNT(*) AS total_students,
+                   AVG(score) AS average_score,
+                   STDDEV_POP(score) AS std_dev,
+                   MIN(score) AS min_score,
+                   MAX(score) AS max_score,
+                   SUM(score * 100 >= %s * %s) AS passed_students
+            FROM exam_sessions
+            WHERE exam_id = %s AND status = 'completed'
+        """, (total_marks, PASS_PERCENTAGE, exam_id))
+        row = cursor.fetchone()
+        cursor.close()
+
+        total_students = row['total_students'] or 0
+        passed_students = int(row['passed_students'] or 0)
+        return {
+            'total_students': total_students,
+            'average_score': float(row['average_score'] or 0),
+            'std_dev': float(row['std_dev'] or 0),
+            'min_score': row['min_score'],
+            'max_score': row['max_score'],
+            'passed_students': passed_students,
+            'pass_rate': round(passed_students / total_students * 100) if total_students else 0,
+            'histogram': None
+        }
+
+    @staticmethod
+    def histogram_labels(histogram):
+        """
+        Pair each bucket count with its percentage range label, e.g. ('70-79%', 12)
+        """
+        width = 100 // HISTOGRAM_BUCKETS
+        labels = [f"{index * width}-{index * width + width - 1}%" for index in range(HISTOGRAM_BUCKETS - 1)]
+        labels.append(f"{(HISTOGRAM_BUCKETS - 1) * width}-100%")
+        return list(zip(labels, histogram))
+
+    @staticmethod
+    def item_analysis(exam_id, answer_key=None):
+        """
+        Attempts, correct rate, option distribution and discrimination index per question
+        """
+        answer_key = answer_key or answer_key_cache.get(exam_id)
+        paper = exam_paper_cache.get(exam_id)
+        question_count = len(answer_key)
+
+        cursor = mysql.connection.cursor()
+        cursor.execute("""
+            SELECT sa.question_id, sa.selected_option, COUNT(*) AS answers, SUM(sa.is_correct) AS correct
+            FROM student_answers sa
+            JOIN exam_sessions es ON sa.session_id = es.id
+            WHERE es.exam_id = %s AND es.status = 'completed'
+            GROUP BY sa.question_id, sa.selected_option
+        """, (exam_id,))
+        option_rows = cursor.fetchall()
+        cursor.close()
+
+        attempts = [0] * question_count
+        correct = [0] * question_count
+        distribution = [dict.fromkeys(OPTIONS, 0) for _ in range(question_count)]
+        for option_row in option_rows:
+            position = answer_key.position(option_row['question_id'])
+            if position is None:
+                continue
+            attempts[position] += option_row['answers']
+            correct[position] += int(option_row['correct'] or 0)
+            option = GradingEngine.normalize_option(option_row['selected_option'])
+            if option in distribution[position]:
+                distribution[position][option] += option_row['answers']
+
+        discrimination = ExamStatistics.discrimination_index(exam_id, answer_key)
+        texts = {question['id']: question['question_text'] for question in paper.questions}
+
+        questions = []
+        for position, question_id in enumerate(answer_key.question_ids):
+            question_attempts = attempts[position]
+            correct_count = correct[position]
+            questions.append({
+                'question_id': question_id,
+                'question_text': texts.get(question_id, ''),
+                'correct_option': answer_key.correct_option_at(position),
+                'attempts': question_attempts,
+                'correct_count': correct_count,
+                'incorrect_count': question_attempts - correct_count,
+                'success_rate': round(correct_count / question_attempts * 100) if question_attempts else 0,
+                'option_counts': distribution[position],
+                'discrimination': None if discrimination is None else round(float(discrimination[position]), 2)
+            })
+        return questions
+
+    @staticmethod
+    def discrimination_index(exam_id, answer_key):
+        """
+        Upper minus lower group correct rate per question, in answer key order.
+
+        Candidates are ranked by score and the top and bottom 27% form the two
+        groups. Both groups are picked with ORDER BY ... LIMIT in SQL and their
+        correct answers counted with one GROUP BY, so only one row per question
+        is read. Returns None when there are too few candidates to form two
+        groups.
+        """
+        question_count = len(answer_key)
+        cursor = mysql.connection.cursor()
+        cursor.execute("""
+            SELECT COUNT(*) AS candidates FROM exam_sessions
+            WHERE exam_id = %s AND status = 'completed'
+        """, (exam_id,))
+        candidates = cursor.fetchone()['candidates']
+
+        group_size = int(round(candidates * DISCRIMINATION_GROUP_RATIO))
+        if not question_count or group_size < 1:
+            cursor.close()
+            return None
+
+        # Ties on score are broken by session id, lowest ids in the lower group
+        cursor.execute("""
+            SELECT sa.question_id,
+                   SUM(g.upper_group) AS upper_correct,
+                   SUM(1 - g.upper_group) AS lower_correct
+            FROM (
+                SELECT id, 0 AS upper_group FROM (
+                    SELECT id FROM exam_sessions
+                    WHERE exam_id = %s AND status = 'completed'
+                    ORDER BY COALESCE(score, 0), id
+                    LIMIT %s
+                ) lower_sessions
+                UNION ALL
+                SELECT id, 1 AS upper_group FROM (
+                    SELECT id FROM exam_sessions
+                    WHERE exam_id = %s AND status = 'completed'
+                    ORDER BY COALESCE(score, 0) DESC, id DESC
+                    LIMIT %s
+                ) upper_sessions
+            ) g
+            JOIN student_answers sa ON sa.session_id = g.id
+            WHERE sa.is_correct = 1
+            GROUP BY sa.question_id
+        """, (exam_id, group_size, exam_id, group_size))
+        rows = cursor.fetchall()
+        cursor.close()
+
+        upper = np.zeros(question_count, dtype=np.int64)
+        lower = np.zeros(question_count, dtype=np.int64)
+        for row in rows:
+            position = answer_key.position(row['question_id'])
+            if position is None:
+                continue
+            upper[position] = int(row['upper_correct'] or 0)
+            lower[position] = int(row['lower_correct'] or 0)
+        return (upper - lower) / group_size
@@ -0,0 +1,167 @@
+import math
+
+from extensions import mysql
+from models.schema import schema_registry
+
+# Fixed-width score histogram: bucket i holds percentages in [i * 10, i * 10 + 10), 100% goes in the last one
+HISTOGRAM_BUCKETS = 10
+
+# Minimum percentage of the total marks counted as a pass
+PASS_PERCENTAGE = 70
+
+BUCKET_COLUMNS = tuple(f"bucket_{index}" for index in range(HISTOGRAM_BUCKETS))
+
+def _bucket_sql(score, total_marks):
+    return f"LEAST(COALESCE({score} * {HISTOGRAM_BUCKETS} DIV NULLIF({total_marks}, 0), 0), {HISTOGRAM_BUCKETS - 1})"
+
+# Recompute rows from exam_sessions, totals come from the questions of each exam
+REBUILD_SQL = f"""
+    INSERT INTO exam_stats (exam_id, total_marks, completed_count, score_sum, score_sq_sum,
+                            min_score, max_score, pass_count, {', '.join(BUCKET_COLUMNS)})
+    SELECT es.exam_id, COALESCE(t.total_marks, 0), COUNT(*),
+           SUM(COALESCE(es.score, 0)), SUM(COALESCE(es.score, 0) * COALESCE(es.score, 0)),
+           MIN(COALESCE(es.score, 0)), MAX(COALESCE(es.score, 0)),
+           SUM(COALESCE(es.score, 0) * 100 >= COALESCE(t.total_marks, 0) * {PASS_PERCENTAGE}),
+           {', '.join(f"SUM({_bucket_sql('COALESCE(es.score, 0)', 'COALESCE(t.total_marks, 0)')} = {index})" for index in range(HISTOGRAM_BUCKETS))}
+    FROM exam_sessions es
+    LEFT JOIN (SELECT exam_id, SUM(marks) AS total_marks FROM questions GROUP BY exam_id) t
+        ON t.exam_id = es.exam_id
+    WHERE es.status = 'completed' {{where}}
+    GROUP BY es.exam_id, t.total_marks
+    ON DUPLICATE KEY UPDATE
+        total_marks = VALUES(total_marks),
+        completed_count = VALUES(completed_count),
+        score_sum = VALUES(score_sum),
+        score_sq_sum = VALUES(score_sq_sum),
+        min_score = VALUES(min_score),
+        max_score = VALUES(max_score),
+        pass_count = VALUES(pass_count),
+        {', '.join(f"{column} = VALUES({column})" for column in BUCKET_COLUMNS)}
+"""
+
+class ExamStatsRollup:
+    """
+    Per-exam result aggregates kept in exam_stats and updated in the same
+    transaction that completes a session, so reading them is O(1) however
+    many candidates took the exam.
+
+    Buckets and the pass count depend on the exam's total marks, which are
+    stored with the row. A row built against different total marks is
+    rebuilt from exam_sessions when it is read.
+    """
+
+    def __init__(self, exam_id, total_marks=0, completed_count=0, score_sum=0, score_sq_sum=0,
+                 min_score=None, max_score=None, pass_count=0, histogram=None):
+        self.exam_id = exam_id
+        self.total_marks = total_marks
+        self.completed_count = completed_count
+        self.score_sum = score_sum
+        self.score_sq_sum = score_sq_sum
+        self.min_score = min_score
+        self.max_score = max_score
+        self.pass_count = pass_count
+        self.histogram = histogram or [0] * HISTOGRAM_BUCKETS
+
+    @property
+    def average_score(self):
+        if not self.completed_count:
+            return 0
+        return float(self.score_sum) / self.completed_count
+
+    @property
+    def std_dev(self):
+        if not self.completed_count:
+            return 0
+        variance = float(self.score_sq_sum) / self.completed_count - self.average_score ** 2
+        return math.sqrt(max(variance, 0))
+
+    @property
+    def pass_rate(self):
+        return round(self.pass_count / self.completed_count * 100) if self.completed_count else 0
+
+    @staticmethod
+    def is_available(fresh=False):
+        return schema_registry.has_table('exam_stats', fresh)
+
+    @staticmethod
+    def bucket_for(score, total_marks):
+        if total_marks <= 0:
+            return 0
+        return min(score * HISTOGRAM_BUCKETS // total_marks, HISTOGRAM_BUCKETS - 1)
+
+    @staticmethod
+    def get(exam_id, total_marks):
+        """
+        Read the exam's aggregates, rebuilding the row first if it was computed against other total marks
+        """
+        cursor = mysql.connection.cursor()
+        row = ExamStatsRollup._fetch(cursor, exam_id)
+        if row is not None and row['total_marks'] != total_marks:
+            ExamStatsRollup.rebuild(cursor, [exam_id])
+            mysql.connection.commit()
+            row = ExamStatsRollup._fetch(cursor, exam_id)
+        cursor.close()
+
+        if not row:
+            return ExamStatsRollup(exam_id, total_marks)
+        return ExamStatsRollup(
+            exam_id=row['exam_id'],
+            total_marks=row['total_marks'],
+            completed_count=row['completed_count'],
+            score_sum=row['score_sum'],
+            score_sq_sum=row['score_sq_sum'],
+            min_score=row['min_score'],
+            max_score=row['max_score'],
+            pass_count=row['pass_count'],
+            histogram=[row[column] for column in BUCKET_COLUMNS]
+        )
+
+    @staticmethod
+    def _fetch(cursor, exam_id):
+        cursor.execute("SELECT * FROM exam_stats WHERE exam_id = %s", (exam_id,))
+        return cursor.fetchone()
+
+    @staticmethod
+    def record_completion(cursor, exam_id, score, total_marks):
+        """
+        Add one completed session to the exam's aggregates on the caller's transaction
+        """
+        # Looked up again on a miss, so no completion is lost once the migration has backfilled the table
+        if not ExamStatsRollup.is_available(fresh=True):
+            return
+        score = score or 0
+        bucket = BUCKET_COLUMNS[ExamStatsRollup.bucket_for(score, total_marks)]
+        passed = 1 if score * 100 >= total_marks * PASS_PERCENTAGE else 0
+        cursor.execute(f"""
+            INSERT INTO exam_stats (exam_id, total_marks, completed_count, score_sum, score_sq_sum,
+                                    min_score, max_score, pass_count, {bucket})
+            VALUES (%s, %s, 1, %s, %s, %s, %s, %s, 1)
+            ON DUPLICATE KEY UPDATE
+                completed_count = completed_count + 1,
+                score_sum = score_sum + VALUES(score_sum),
+                score_sq_sum = score_sq_sum + VALUES(score_sq_sum),
+                min_score = LEAST(COALESCE(min_score, VALUES(min_score)), VALUES(min_score)),
+                max_score = GREATEST(COALESCE(max_score, VALUES(max_score)), VALUES(max_score)),
+                pass_count = pass_count + VALUES(pass_count),
+                {bucket} = {bucket} + 1
+        """, (exam_id, total_marks, score, score * score, score, score, passed))
+
+    @staticmethod
+    def rebuild(cursor, exam_ids=None):
+        """
+        Recompute aggregates from exam_sessions, for all exams or just the given ones
+        """
+        if not ExamStatsRollup.is_available(fresh=True):
+            return
+        if exam_ids is None:
+            cursor.execute("DELETE FROM exam_stats")
+            cursor.execute(REBUILD_SQL.format(where=""))
+            return
+
+        exam_ids = list(exam_ids)
+        if not exam_ids:
+            return
+        placeholders = ', '.join(['%s'] * len(exam_ids))
+        # Exams without completed sessions left must lose their row rather than keep stale numbers
+        cursor.execute(f"DELETE FROM exam_stats WHERE exam_id IN ({placeholders})", exam_ids)
+        cursor.execute(REBUILD_SQL.format(where=f"AND es.exam_id IN ({placeholders})"), exam_ids)
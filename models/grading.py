@@ -0,0 +1,259 @@
+from array import array
+import logging
+
+import numpy as np
+
+from models.cache import VersionedCache
+from models.exam import Exam
+
+logger = logging.getLogger(__name__)
+
+class AnswerKey:
+    """
+    Immutable compiled answer key for one exam version.
+
+    Question ids and marks are compact integer arrays and the correct options
+    are one byte per question, all in question id order.
+    """
+    __slots__ = ('exam_id', 'version', 'question_ids', 'correct_options', 'marks', 'total_marks', '_positions')
+
+    def __init__(self, exam_id, version, questions):
+        rows = sorted(questions, key=lambda question: int(question['id']))
+        codes = []
+        for question in rows:
+            code = GradingEngine.normalize_option(question['correct_option']) or '?'
+            codes.append(code[0])
+
+        object.__setattr__(self, 'exam_id', exam_id)
+        object.__setattr__(self, 'version', version)
+        object.__setattr__(self, 'question_ids', array('l', (int(question['id']) for question in rows)))
+        object.__setattr__(self, 'correct_options', ''.join(codes).encode('ascii', 'replace'))
+        object.__setattr__(self, 'marks', array('l', (int(question['marks']) for question in rows)))
+        object.__setattr__(self, 'total_marks', sum(self.marks))
+        object.__setattr__(self, '_positions', {question_id: index for index, question_id in enumerate(self.question_ids)})
+
+    def __setattr__(self, name, value):
+        raise AttributeError("AnswerKey is immutable")
+
+    def __len__(self):
+        return len(self.question_ids)
+
+    def position(self, question_id):
+        return self._positions.get(question_id)
+
+    def correct_option_at(self, position):
+        return chr(self.correct_options[position])
+
+    @staticmethod
+    def load(exam_id, version=None):
+        from extensions import mysql
+        cursor = mysql.connection.cursor()
+        cursor.execute("SELECT id, correct_option, marks FROM questions WHERE exam_id = %s", (exam_id,))
+        questions = cursor.fetchall()
+        cursor.close()
+        return AnswerKey(exam_id, version, questions)
+
+
+class GradeResult:
+    def __init__(self, obtained_marks, total_marks, answer_rows):
+        self.obtained_marks = obtained_marks
+        self.total_marks = total_marks
+        # (question_id, selected_option, is_correct) for every answered question
+        self.answer_rows = answer_rows
+
+    @property
+    def percentage(self):
+        return (self.obtained_marks / self.total_marks) * 100 if self.total_marks > 0 else 0
+
+
+class GradingEngine:
+    """
+    Set-based grading: answers are normalized once, scored against a compiled
+    key in a single pass and persisted with one multi-row INSERT.
+    """
+
+    @staticmethod
+    def normalize_option(option):
+        """
+        Normalize 'option_a', 'A' or 'a' to the single character code 'a'
+        """
+        if option is None:
+            return None
+        normalized = str(option).strip().lower()
+        if normalized.startswith('option_'):
+            normalized = normalized[-1]  # Extract the last character (a, b, c, d)
+        return normalized or None
+
+    @staticmethod
+    def normalize_answers(answers):
+        """
+        Convert the submitted {question_id: option} dict into {int question_id: option code},
+        dropping keys that aren't question ids and blank answers
+        """
+        normalized = {}
+        if not answers:
+            return normalized
+
+        for question_id, selected_option in answers.items():
+            try:
+                question_id = int(str(question_id).replace('question_', ''))
+            except (TypeError, ValueError):
+                continue
+            selected_normalized = GradingEngine.normalize_option(selected_option)
+            if selected_normalized:
+                normalized[question_id] = selected_normalized
+        return normalized
+
+    @staticmethod
+    def grade(answer_key, answers):
+        """
+        Score normalized answers against a compiled AnswerKey in one pass
+        """
+        obtained_marks = 0
+        answer_rows = []
+        for question_id, selected_option in answers.items():
+            position = answer_key.position(question_id)
+            if position is None:
+                # Not a question of this exam
+                continue
+            is_correct = selected_option == answer_key.correct_option_at(position)
+            if is_correct:
+                obtained_marks += answer_key.marks[position]
+            answer_rows.append((question_id, selected_option, is_correct))
+
+        return GradeResult(obtained_marks, answer_key.total_marks, answer_rows)
+
+    @staticmethod
+    def save_answers(cursor, session_id, answer_rows):
+        """
+        Persist all answer rows with a single multi-row INSERT on the caller's transaction
+        """
+        if not answer_rows:
+            return
+
+        values_sql = ', '.join(['(%s, %s, %s, %s)'] * len(answer_rows))
+        params = []
+        for question_id, selected_option, is_correct in answer_rows:
+            params.extend((session_id, question_id, selected_option, is_correct))
+
+        cursor.execute(f"""
+            INSERT INTO student_answers
+            (session_id, question_id, selected_option, is_correct)
+            VALUES {values_sql}
+        """, params)
+
+    @staticmethod
+    def regrade_exam(exam_id, chunk_size=1000):
+        """
+        Re-score every completed session of an exam against its current answer key.
+        
+        All answers are loaded as a sessions x questions matrix of option codes and
+        compared against the key with NumPy. student_answers.is_correct and
+        exam_sessions.score are then bulk-updated for the rows that changed only.
+        Returns a dict with the number of sessions, changed sessions and changed answers.
+        """
+        from extensions import mysql
+
+        answer_key_cache.invalidate(exam_id)
+        answer_key = AnswerKey.load(exam_id)
+
+        cursor = mysql.connection.cursor()
+        cursor.execute("""
+            SELECT id, student_id, score FROM exam_sessions
+            WHERE exam_id = %s AND status = 'completed'
+            ORDER BY id
+        """, (exam_id,))
+        sessions = cursor.fetchall()
+        summary = {'sessions': len(sessions), 'sessions_changed': 0, 'answers_changed': 0}
+        if not sessions or not len(answer_key):
+            cursor.close()
+            return summary
+
+        cursor.execute("""
+            SELECT sa.id, sa.session_id, sa.question_id, sa.selected_option, sa.is_correct
+            FROM student_answers sa
+            JOIN exam_sessions es ON sa.session_id = es.id
+            WHERE es.exam_id = %s AND es.status = 'completed'
+        """, (exam_id,))
+        answers = cursor.fetchall()
+
+        session_ids = np.fromiter((row['id'] for row in sessions), dtype=np.int64, count=len(sessions))
+        old_scores = np.fromiter((row['score'] or 0 for row in sessions), dtype=np.int64, count=len(sessions))
+        question_ids = np.asarray(answer_key.question_ids, dtype=np.int64)
+        key_codes = np.frombuffer(answer_key.correct_options, dtype=np.uint8)
+        marks = np.asarray(answer_key.marks, dtype=np.int64)
+
+        count = len(answers)
+        answer_ids = np.fromiter((row['id'] for row in answers), dtype=np.int64, count=count)
+        answer_sessions = np.fromiter((row['session_id'] for row in answers), dtype=np.int64, count=count)
+        answer_questions = np.fromiter((row['question_id'] for row in answers), dtype=np.int64, count=count)
+        answer_codes = np.fromiter(
+            (ord((GradingEngine.normalize_option(row['selected_option']) or '\0')[0]) for row in answers),
+            dtype=np.uint8, count=count)
+        old_correct = np.fromiter((bool(row['is_correct']) for row in answers), dtype=bool, count=count)
+
+        # Map answers onto matrix coordinates, ignoring questions that are no longer in the key
+        row_index = np.searchsorted(session_ids, answer_sessions)
+        column_index = np.clip(np.searchsorted(question_ids, answer_questions), 0, len(question_ids) - 1)
+        in_key = question_ids[column_index] == answer_questions
+
+        matrix = np.zeros((len(session_ids), len(question_ids)), dtype=np.uint8)
+        matrix[row_index[in_key], column_index[in_key]] = answer_codes[in_key]
+
+        correct_matrix = (matrix == key_codes) & (matrix != 0)
+        new_scores = correct_matrix.astype(np.int64) @ marks
+
+        new_correct = np.zeros(count, dtype=bool)
+        new_correct[in_key] = answer_codes[in_key] == key_codes[column_index[in_key]]
+
+        changed_answers = new_correct != old_correct
+        changed_sessions = new_scores != old_scores
+
+        # Bulk update the answers that flipped, one statement per direction and chunk
+        for is_correct in (True, False):
+            ids = answer_ids[changed_answers & (new_correct == is_correct)].tolist()
+            for start in range(0, len(ids), chunk_size):
+                chunk = ids[start:start + chunk_size]
+                placeholders = ', '.join(['%s'] * len(chunk))
+                cursor.execute(f"UPDATE student_answers SET is_correct = %s WHERE id IN ({placeholders})",
+                               [is_correct] + chunk)
+
+        # Bulk update the changed scores with a CASE expression per chunk
+        changed_ids = session_ids[changed_sessions].tolist()
+        changed_scores = new_scores[changed_sessions].tolist()
+        for start in range(0, len(changed_ids), chunk_size):
+            chunk_ids = changed_ids[start:start + chunk_size]
+            chunk_scores = changed_scores[start:start + chunk_size]
+            cases = ' '.join(['WHEN %s THEN %s'] * len(chunk_ids))
+            placeholders = ', '.join(['%s'] * len(chunk_ids))
+            params = [value for pair in zip(chunk_ids, chunk_scores) for value in pair] + chunk_ids
+            cursor.execute(f"UPDATE exam_sessions SET score = CASE id {cases} END WHERE id IN ({placeholders})", params)
+
+        # Score sums in the affected students' summaries are now outdated
+        if changed_ids:
+            from models.student_summary import StudentSummary
+            changed_session_ids = set(changed_ids)
+            affected_students = sorted({row['student_id'] for row in sessions if row['id'] in changed_session_ids})
+            for start in range(0, len(affected_students), chunk_size):
+                StudentSummary.rebuild(cursor, affected_students[start:start + chunk_size])
+
+        # Rebuilt even without score changes, the total marks may have changed
+        from models.exam_stats_rollup import ExamStatsRollup
+        ExamStatsRollup.rebuild(cursor, [exam_id])
+
+        mysql.connection.commit()
+        cursor.close()
+
+        from models.exam_stats import ExamStatistics
+        ExamStatistics.invalidate(exam_id)
+
+        summary['sessions_changed'] = int(changed_sessions.sum())
+        summary['answers_changed'] = int(changed_answers.sum())
+        logger.info(f"Re-graded exam {exam_id}: {summary}")
+        return summary
+
+
+# Shared answer key cache, configured in create_app. Keys are versioned with
+# exams.question_version, which every question change bumps, so grading in
+# any process never uses a key after the exam's questions changed.
+answer_key_cache = VersionedCache(AnswerKey.load, version_of=Exam.get_question_version, key_type=int)
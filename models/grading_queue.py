@@ -0,0 +1,322 @@
+from datetime import datetime, timedelta
+import atexit
+import json
+import logging
+import os
+import threading
+import uuid
+
+from extensions import mysql
+from models.exam_session import ExamSession
+from models.exam_stats import ExamStatistics
+
+logger = logging.getLogger(__name__)
+
+class GradingQueue:
+    """
+    Durable queue of submitted exams waiting to be graded, kept in the
+    grading_jobs table.
+
+    Submitting marks the session 'submitted' and stores the raw answers in the
+    same transaction, so an accepted submission survives a crash of the web
+    or grading worker. Jobs move from 'queued' to 'running' when a worker
+    claims them and to 'done' in the transaction that grades the session, or
+    back to 'queued' on failure until they run out of attempts ('failed').
+    Claims use a plain UPDATE ... LIMIT with a per-claim token, so workers in
+    any number of processes never grade the same job twice.
+    """
+
+    @staticmethod
+    def enqueue(session_id, student_id, answers):
+        """
+        Accept a submission of one of the student's sessions and return its job id.
+
+        A repeated submit of a session already queued returns the existing job,
+        so clients can retry safely. Raises ValueError for an unknown session
+        or one completed without the queue.
+        """
+        cursor = mysql.connection.cursor()
+        try:
+            cursor.execute("""
+                SELECT status FROM exam_sessions
+                WHERE id = %s AND student_id = %s
+                FOR UPDATE
+            """, (session_id, student_id))
+            session = cursor.fetchone()
+            if not session:
+                raise ValueError("Invalid session")
+
+            if session['status'] != 'in_progress':
+                cursor.execute("SELECT id FROM grading_jobs WHERE session_id = %s", (session_id,))
+                job = cursor.fetchone()
+                mysql.connection.commit()
+                if job:
+                    return job['id']
+                raise ValueError("Invalid or already completed session")
+
+            # The submission time is the session's end time, however long grading takes
+            now = datetime.now()
+            cursor.execute("""
+                UPDATE exam_sessions SET status = 'submitted', end_time = %s WHERE id = %s
+            """, (now, session_id))
+            cursor.execute("""
+                INSERT INTO grading_jobs (session_id, answers, created_at)
+                VALUES (%s, %s, %s)
+            """, (session_id, json.dumps(answers or {}), now))
+            job_id = cursor.lastrowid
+            mysql.connection.commit()
+            return job_id
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def get_status(session_id, student_id):
+        """
+        Return {'status', 'score', 'error'} of the student's submission, or None
+        """
+        cursor = mysql.connection.cursor()
+        cursor.execute("""
+            SELECT gj.status, gj.score, gj.error
+            FROM grading_jobs gj
+            JOIN exam_sessions es ON es.id = gj.session_id
+            WHERE gj.session_id = %s AND es.student_id = %s
+        """, (session_id, student_id))
+        job = cursor.fetchone()
+        cursor.close()
+        return job
+
+    @staticmethod
+    def claim(limit, job_timeout, max_attempts):
+        """
+        Mark up to `limit` queued jobs as running for the caller and return them,
+        oldest first. Jobs left running longer than `job_timeout` seconds by a
+        worker that died are queued again first.
+        """
+        now = datetime.now()
+        token = uuid.uuid4().hex
+        cursor = mysql.connection.cursor()
+        cursor.execute("""
+            UPDATE grading_jobs
+            SET status = IF(attempts >= %s, 'failed', 'queued'),
+                claim_token = NULL,
+                error = 'Grading worker timed out'
+            WHERE status = 'running' AND started_at < %s
+        """, (max_attempts, now - timedelta(seconds=job_timeout)))
+        cursor.execute("""
+            UPDATE grading_jobs
+            SET status = 'running', claim_token = %s, started_at = %s, attempts = attempts + 1
+            WHERE status = 'queued'
+            ORDER BY id
+            LIMIT %s
+        """, (token, now, limit))
+        jobs = []
+        if cursor.rowcount:
+            cursor.execute("""
+                SELECT id, session_id, answers, attempts FROM grading_jobs
+                WHERE claim_token = %s
+                ORDER BY id
+            """, (token,))
+            jobs = cursor.fetchall()
+        mysql.connection.commit()
+        cursor.close()
+        return jobs
+
+    @staticmethod
+    def grade(job):
+        """
+        Grade a claimed job and mark it done in the same transaction. Returns the percentage score.
+        """
+        cursor = mysql.connection.cursor()
+        answers = json.loads(job['answers'] or '{}')
+        score = ExamSession.grade_submission(cursor, job['session_id'], answers)
+        cursor.execute("""
+            UPDATE grading_jobs
+            SET status = 'done', score = %s, error = NULL, finished_at = %s
+            WHERE id = %s
+        """, (score, datetime.now(), job['id']))
+        cursor.execute("SELECT exam_id FROM exam_sessions WHERE id = %s", (job['session_id'],))
+        session = cursor.fetchone()
+        mysql.connection.commit()
+        cursor.close()
+
+        # The exam's cached results statistics no longer include every submission
+        if session:
+            ExamStatistics.invalidate(session['exam_id'])
+        return score
+
+    @staticmethod
+    def fail(job, error, max_attempts):
+        """
+        Queue a job that raised for another attempt, or give up on it.
+        Returns True if it will be retried.
+        """
+        retry = job['attempts'] < max_attempts
+        cursor = mysql.connection.cursor()
+        cursor.execute("""
+            UPDATE grading_jobs
+            SET status = %s, claim_token = NULL, error = %s, finished_at = %s
+            WHERE id = %s
+        """, ('queued' if retry else 'failed', error[:1000], None if retry else datetime.now(), job['id']))
+        mysql.connection.commit()
+        cursor.close()
+        return retry
+
+    @staticmethod
+    def retry_failed():
+        """
+        Queue every failed job again with fresh attempts, returns how many
+        """
+        cursor = mysql.connection.cursor()
+        cursor.execute("""
+            UPDATE grading_jobs SET status = 'queued', attempts = 0, finished_at = NULL
+            WHERE status = 'failed'
+        """)
+        count = cursor.rowcount
+        mysql.connection.commit()
+        cursor.close()
+        return count
+
+
+class GradingWorkerPool:
+    """
+    Threads that grade queued submissions outside the request that accepted them.
+
+    Each thread claims up to `batch_size` jobs at a time and grades each in
+    its own application context, so a failing job only rolls back itself.
+    Idle threads poll every `poll_interval` seconds and are woken at once by
+    notify() when this process queues a job. The pool starts lazily and per
+    process in the web workers, and `flask grade-submissions` runs one in a
+    dedicated process.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = False
+        self.workers = 2
+        self.batch_size = 10
+        self.poll_interval = 1.0
+        self.max_attempts = 3
+        self.job_timeout = 300
+        self._threads = []
+        self._pid = None
+        self._atexit_registered = False
+        self._stop_event = threading.Event()
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._counters = {
+            'claimed': 0,
+            'graded': 0,
+            'retried': 0,
+            'failed': 0
+        }
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('GRADING_QUEUE_ENABLED', True)
+        self.workers = app.config.get('GRADING_WORKERS', self.workers)
+        self.batch_size = app.config.get('GRADING_CLAIM_BATCH_SIZE', self.batch_size)
+        self.poll_interval = app.config.get('GRADING_POLL_INTERVAL_MS', 1000) / 1000.0
+        self.max_attempts = app.config.get('GRADING_MAX_ATTEMPTS', self.max_attempts)
+        self.job_timeout = app.config.get('GRADING_JOB_TIMEOUT', self.job_timeout)
+
+    def _alive(self):
+        return self._pid == os.getpid() and any(thread.is_alive() for thread in self._threads)
+
+    def ensure_started(self, workers=None):
+        # Started lazily and per process, forked web workers each get their own threads
+        if self._alive():
+            return
+        with self._lock:
+            if self._alive():
+                return
+            self._pid = os.getpid()
+            self._stop_event.clear()
+            self._threads = [
+                threading.Thread(target=self._run, name=f'grading-worker-{index}', daemon=True)
+                for index in range(workers or self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+            if not self._atexit_registered:
+                atexit.register(self.stop)
+                self._atexit_registered = True
+
+    def notify(self):
+        """
+        Wake the idle workers of this process, a job was just queued
+        """
+        self.ensure_started()
+        self._wakeup.set()
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                claimed = self.run_once()
+            except Exception as e:
+                logger.error(f"Error claiming grading jobs: {e}")
+                claimed = 0
+            if not claimed:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def run_once(self):
+        """
+        Claim and grade one batch of jobs, returns how many were claimed
+        """
+        with self.app.app_context():
+            jobs = GradingQueue.claim(self.batch_size, self.job_timeout, self.max_attempts)
+        self._count('claimed', len(jobs))
+        for job in jobs:
+            self._grade(job)
+        return len(jobs)
+
+    def _grade(self, job):
+        try:
+            with self.app.app_context():
+                GradingQueue.grade(job)
+            self._count('graded')
+        except Exception as e:
+            logger.error(f"Failed to grade session {job['session_id']} (attempt {job['attempts']}): {e}")
+            try:
+                with self.app.app_context():
+                    retried = GradingQueue.fail(job, str(e), self.max_attempts)
+                self._count('retried' if retried else 'failed')
+            except Exception as fail_error:
+                # Left running, the job timeout queues it again
+                logger.error(f"Could not record grading failure of job {job['id']}: {fail_error}")
+
+    def stop(self, timeout=10):
+        """
+        Stop the worker threads after their current batch
+        """
+        self._stop_event.set()
+        self._wakeup.set()
+        if self._pid == os.getpid():
+            for thread in self._threads:
+                if thread.is_alive():
+                    thread.join(timeout)
+
+    def wait(self):
+        """
+        Block until the workers stop, for the dedicated worker process
+        """
+        for thread in self._threads:
+            while thread.is_alive():
+                thread.join(1)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats['enabled'] = self.enabled
+        stats['workers'] = sum(1 for thread in self._threads if thread.is_alive()) if self._pid == os.getpid() else 0
+        return stats
+
+
+# Shared worker pool, configured in create_app
+grading_workers = GradingWorkerPool()
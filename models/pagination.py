@@ -0,0 +1,57 @@
+import base64
+from datetime import datetime
+import json
+
+class Page:
+    """
+    One page of a keyset-paginated listing.
+
+    `next_cursor` is an opaque token for the page after this one, or None on
+    the last page. Model methods are asked for `page_size + 1` rows so the
+    extra row tells whether another page exists without a COUNT query.
+    """
+
+    def __init__(self, items, next_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @staticmethod
+    def build(rows, page_size, key):
+        """
+        Trim `rows` (fetched with limit=page_size + 1) to a page, `key(row)` gives the row's sort key
+        """
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            return Page(rows, encode_cursor(key(rows[-1])))
+        return Page(rows)
+
+
+def encode_cursor(values):
+    payload = [{'dt': value.isoformat()} if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, size):
+    """
+    Turn a token from encode_cursor back into its key tuple of `size` values,
+    None for a missing or malformed token
+    """
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        values = tuple(datetime.fromisoformat(value['dt']) if isinstance(value, dict) else value for value in payload)
+    except (ValueError, TypeError, KeyError):
+        return None
+    return values if len(values) == size else None
@@ -1,24 +1,99 @@
 from datetime import datetime
-import base64
+import atexit
 import logging
+import os
+import queue
+import threading
+import time
+
+from models.proctoring_coalescer import proctoring_coalescer
+from models.schema import schema_registry
+from models.screenshot_dedup import near_duplicate_filter, perceptual_hash
+from models.screenshot_pipeline import ARCHIVE_SUFFIX, THUMBNAIL_SUFFIX, derived_path, screenshot_pipeline
+from models.screenshot_store import ScreenshotStore
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class ProctoringLog:
-    def __init__(self, id=None, session_id=None, log_type=None, details=None, timestamp=None, screenshot=None):
+    def __init__(self, id=None, session_id=None, log_type=None, details=None, timestamp=None, screenshot=None, screenshot_path=None,
+                 has_screenshot=None, occurrence_count=1, last_timestamp=None):
         self.id = id
         self.session_id = session_id
         self.log_type = log_type
         self.details = details
         self.timestamp = timestamp
         self.screenshot = screenshot
+        self.screenshot_path = screenshot_path
+        self.has_screenshot = bool(screenshot or screenshot_path) if has_screenshot is None else has_screenshot
+        # Repeated events are coalesced into one row, `timestamp` is the first occurrence
+        self.occurrence_count = occurrence_count or 1
+        self.last_timestamp = last_timestamp or timestamp
+    
+    @staticmethod
+    def can_coalesce():
+        return proctoring_coalescer.enabled and schema_registry.has_column('proctoring_logs', 'occurrence_count')
+    
+    @staticmethod
+    def _coalesce_into(cursor, log_id, count, details, last_timestamp):
+        """
+        Fold `count` more occurrences into an existing row, returns False if the row is gone
+        """
+        cursor.execute("""
+            UPDATE proctoring_logs
+            SET occurrence_count = occurrence_count + %s,
+                last_timestamp = GREATEST(COALESCE(last_timestamp, timestamp), %s),
+                details = %s
+            WHERE id = %s
+        """, (count, last_timestamp, details, log_id))
+        return cursor.rowcount > 0
+        
+    @staticmethod
+    def _process_screenshot(screenshot, session_id=None, log_type=None):
+        """
+        Write a screenshot to the content-addressed store and return its relative path.
+        
+        If the session stored a near-identical frame for the same log type recently, nothing is written
+        and the earlier frame's path is returned, so the log references that image.
+        """
+        if not screenshot:
+            return None
+        
+        image_bytes, extension = ScreenshotStore.decode(screenshot)
+        if image_bytes is None:
+            return None
+        
+        try:
+            session_id = int(session_id)
+        except (TypeError, ValueError):
+            session_id = None
+        
+        image_hash = None
+        if near_duplicate_filter.enabled and session_id is not None:
+            image_hash = perceptual_hash(image_bytes)
+            earlier_path = near_duplicate_filter.find(session_id, log_type, image_hash)
+            if earlier_path:
+                return earlier_path
         
+        try:
+            relative_path = ScreenshotStore.save_bytes(image_bytes, extension)
+        except Exception as e:
+            logger.error(f"Failed to store screenshot: {e}")
+            return None
+        
+        near_duplicate_filter.remember(session_id, log_type, image_hash, relative_path)
+        # Thumbnail and archival copy are produced in the background
+        screenshot_pipeline.submit(relative_path)
+        return relative_path
+    
     @staticmethod
     def create_log(session_id, log_type, details=None, screenshot=None):
         """
-        Create a new proctoring log entry with improved error handling and validation
+        Create a new proctoring log entry with improved error handling and validation.
+        
+        A repeat of the session's previous event of the same type within the
+        coalescing window is merged into that row, whose id is returned.
         """
         if not session_id:
             logger.error("Cannot create log: session_id is required")
@@ -33,73 +108,37 @@ class ProctoringLog:
             now = datetime.now()
             cursor = mysql.connection.cursor()
             
-            # First, check if the proctoring_logs table exists
-            cursor.execute("SHOW TABLES LIKE 'proctoring_logs'")
-            if not cursor.fetchone():
-                logger.warning("proctoring_logs table does not exist, creating it")
-                # Create the table if it doesn't exist
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS proctoring_logs (
-                        id INT AUTO_INCREMENT PRIMARY KEY,
-                        session_id INT NOT NULL,
-                        log_type VARCHAR(50) NOT NULL,
-                        details TEXT,
-                        screenshot LONGTEXT,
-                        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (session_id) REFERENCES exam_sessions(id) ON DELETE CASCADE
-                    )
-                """)
-                mysql.connection.commit()
+            # Table existence and columns come from the schema registry loaded at startup
+            columns = ['session_id', 'log_type', 'details', 'timestamp']
+            values = [session_id, log_type, details, now]
+            screenshot_path = None
+            if schema_registry.has_column('proctoring_logs', 'screenshot_path'):
+                # Store the screenshot on disk, only its path goes into the row
+                screenshot_path = ProctoringLog._process_screenshot(screenshot, session_id, log_type)
+                columns.append('screenshot_path')
+                values.append(screenshot_path)
             
-            # Process screenshot - save truncated version if too large
-            processed_screenshot = None
-            if screenshot:
-                # Check if screenshot is already encoded
-                if isinstance(screenshot, str) and screenshot.startswith('data:image/'):
-                    # Limit screenshot size if needed
-                    if len(screenshot) > 1000000:  # If larger than ~1MB
-                        processed_screenshot = screenshot[:100000] + "...truncated..."
-                    else:
-                        processed_screenshot = screenshot
-                else:
-                    # Try to encode it
-                    try:
-                        encoded = base64.b64encode(screenshot).decode('utf-8')
-                        processed_screenshot = f"data:image/jpeg;base64,{encoded}"
-                    except Exception as e:
-                        logger.error(f"Failed to encode screenshot: {e}")
-            
-            # Insert the log entry
-            try:
-                cursor.execute("""
-                    INSERT INTO proctoring_logs (session_id, log_type, details, screenshot, timestamp)
-                    VALUES (%s, %s, %s, %s, %s)
-                """, (session_id, log_type, details, processed_screenshot, now))
-                
-                log_id = cursor.lastrowid
-                mysql.connection.commit()
-                
-                logger.info(f"Created proctoring log: ID={log_id}, Type={log_type}, Session={session_id}")
-                return log_id
-                
-            except Exception as insert_error:
-                logger.error(f"Database insertion error: {insert_error}")
-                # Check if the error is related to a missing column
-                if "Unknown column 'screenshot'" in str(insert_error):
-                    # Try without the screenshot column
-                    cursor.execute("""
-                        INSERT INTO proctoring_logs (session_id, log_type, details, timestamp)
-                        VALUES (%s, %s, %s, %s)
-                    """, (session_id, log_type, details, now))
-                    
-                    log_id = cursor.lastrowid
-                    mysql.connection.commit()
-                    
-                    logger.info(f"Created proctoring log without screenshot: ID={log_id}, Type={log_type}")
-                    return log_id
-                else:
-                    # Re-raise if it's not a column issue
-                    raise
+            coalesce = ProctoringLog.can_coalesce()
+            if coalesce:
+                run = proctoring_coalescer.match(session_id, log_type, screenshot_path, now)
+                if run:
+                    if ProctoringLog._coalesce_into(cursor, run[0], 1, details, now):
+                        mysql.connection.commit()
+                        return run[0]
+                    proctoring_coalescer.forget(session_id, log_type, run[0])
+            
+            cursor.execute(f"""
+                INSERT INTO proctoring_logs ({', '.join(columns)})
+                VALUES ({', '.join(['%s'] * len(columns))})
+            """, values)
+            
+            log_id = cursor.lastrowid
+            mysql.connection.commit()
+            if coalesce:
+                proctoring_coalescer.remember(session_id, log_type, log_id, screenshot_path, now)
+            
+            logger.info(f"Created proctoring log: ID={log_id}, Type={log_type}, Session={session_id}")
+            return log_id
                     
         except Exception as e:
             logger.error(f"Error creating proctoring log: {e}")
@@ -109,17 +148,6 @@ class ProctoringLog:
                 
                 # Try to create log in a backup table without foreign key constraints
                 try:
-                    cursor.execute("""
-                        CREATE TABLE IF NOT EXISTS proctoring_logs_backup (
-                            id INT AUTO_INCREMENT PRIMARY KEY,
-                            session_id INT NOT NULL,
-                            log_type VARCHAR(50) NOT NULL,
-                            details TEXT,
-                            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-                        )
-                    """)
-                    mysql.connection.commit()
-                    
                     cursor.execute("""
                         INSERT INTO proctoring_logs_backup (session_id, log_type, details, timestamp)
                         VALUES (%s, %s, %s, %s)
@@ -138,46 +166,240 @@ class ProctoringLog:
             return None
     
     @staticmethod
-    def get_logs_by_session(session_id):
+    def create_logs_bulk(events):
         """
-        Get all proctoring logs for a specific session
+        Create many proctoring log entries with a single multi-row INSERT and one commit.
+        
+        `events` is a list of dicts with session_id, log_type and optional details/screenshot.
+        A server-side `received_at` datetime, if present, is used as the log timestamp,
+        and a `screenshot_path` stands for a screenshot already stored by the write-behind queue.
+        Repeated events are coalesced as in create_log, both within the batch
+        and into rows written earlier.
+        Returns a list in the same order as `events`, each item either
+        {'log_id': <id>}, {'log_id': <id>, 'coalesced': True} or {'error': <message>}.
+        Errors from the database rather than the event also carry 'retryable': True.
         """
+        results = [None] * len(events)
+        valid = []
+        
+        # Validate events up front so one bad event doesn't fail the whole batch
+        for index, event in enumerate(events):
+            if not isinstance(event, dict):
+                results[index] = {'error': 'Event must be an object'}
+                continue
+            if not event.get('session_id'):
+                results[index] = {'error': 'session_id is required'}
+                continue
+            if not event.get('log_type'):
+                results[index] = {'error': 'log_type is required'}
+                continue
+            try:
+                int(event['session_id'])
+            except (TypeError, ValueError):
+                results[index] = {'error': 'session_id must be an integer'}
+                continue
+            valid.append(index)
+        
+        if not valid:
+            return results
+        
+        cursor = None
         try:
             from extensions import mysql
+            now = datetime.now()
             cursor = mysql.connection.cursor()
             
-            # Check if the table exists
-            cursor.execute("SHOW TABLES LIKE 'proctoring_logs'")
-            if not cursor.fetchone():
+            # Resolve all referenced sessions in one query instead of relying on
+            # a foreign key failure, which would abort the entire multi-row insert
+            session_ids = sorted({int(events[i]['session_id']) for i in valid})
+            placeholders = ', '.join(['%s'] * len(session_ids))
+            cursor.execute(f"SELECT id FROM exam_sessions WHERE id IN ({placeholders})", tuple(session_ids))
+            existing_sessions = {row['id'] for row in cursor.fetchall()}
+            
+            store_screenshots = schema_registry.has_column('proctoring_logs', 'screenshot_path')
+            coalesce = ProctoringLog.can_coalesce()
+            # One entry per row to insert or to fold occurrences into, in event order
+            groups = []
+            open_runs = {}
+            for index in list(valid):
+                event = events[index]
+                session_id = int(event['session_id'])
+                if session_id not in existing_sessions:
+                    logger.error(f"Invalid session_id in batch: {session_id}")
+                    results[index] = {'error': f'Invalid session_id: {session_id}'}
+                    valid.remove(index)
+                    continue
+                log_type = event['log_type']
+                details = event.get('details', '')
+                if not store_screenshots:
+                    screenshot_path = None
+                elif 'screenshot_path' in event:
+                    screenshot_path = event['screenshot_path']
+                else:
+                    screenshot_path = ProctoringLog._process_screenshot(event.get('screenshot'), session_id, log_type)
+                timestamp = event.get('received_at') or now
+                
+                key = (session_id, log_type)
+                group = open_runs.get(key) if coalesce else None
+                if group is not None and proctoring_coalescer.continues(group['screenshot_path'], group['last_timestamp'],
+                                                                        screenshot_path, timestamp):
+                    group['count'] += 1
+                    group['details'] = details
+                    group['last_timestamp'] = max(group['last_timestamp'], timestamp)
+                    group['indexes'].append(index)
+                    continue
+                
+                # Rows of earlier batches only continue a run not already restarted in this one
+                run = proctoring_coalescer.match(session_id, log_type, screenshot_path, timestamp) if coalesce and group is None else None
+                group = {
+                    'log_id': run[0] if run else None,
+                    'inserted': run is None,
+                    'session_id': session_id,
+                    'log_type': log_type,
+                    'details': details,
+                    'screenshot_path': run[1] if run else screenshot_path,
+                    'timestamp': timestamp,
+                    'last_timestamp': timestamp,
+                    'count': 1,
+                    'indexes': [index]
+                }
+                groups.append(group)
+                open_runs[key] = group
+            
+            for group in groups:
+                if group['inserted']:
+                    continue
+                if not ProctoringLog._coalesce_into(cursor, group['log_id'], group['count'], group['details'],
+                                                    group['last_timestamp']):
+                    # The row is gone, insert the run as a new one
+                    proctoring_coalescer.forget(group['session_id'], group['log_type'], group['log_id'])
+                    group['log_id'] = None
+                    group['inserted'] = True
+            
+            new_groups = [group for group in groups if group['inserted']]
+            if not new_groups:
+                mysql.connection.commit()
+                cursor.close()
+                ProctoringLog._fill_bulk_results(results, groups)
+                return results
+            
+            columns = ['session_id', 'log_type', 'details', 'timestamp']
+            if store_screenshots:
+                columns.append('screenshot_path')
+            if coalesce:
+                columns.extend(('occurrence_count', 'last_timestamp'))
+            params = []
+            for group in new_groups:
+                params.extend((group['session_id'], group['log_type'], group['details'], group['timestamp']))
+                if store_screenshots:
+                    params.append(group['screenshot_path'])
+                if coalesce:
+                    params.extend((group['count'], group['last_timestamp']))
+            
+            # Build one explicit multi-row statement. cursor.executemany may split large
+            # payloads into several statements, which would break the id arithmetic below.
+            row_sql = '(' + ', '.join(['%s'] * len(columns)) + ')'
+            cursor.execute(f"""
+                INSERT INTO proctoring_logs ({', '.join(columns)})
+                VALUES {', '.join([row_sql] * len(new_groups))}
+            """, params)
+            
+            # A multi-row INSERT is a "simple insert" for InnoDB, so its auto-increment
+            # ids are consecutive and lastrowid is the id of the first row.
+            first_id = cursor.lastrowid
+            mysql.connection.commit()
+            cursor.close()
+            
+            for offset, group in enumerate(new_groups):
+                group['log_id'] = first_id + offset
+                if coalesce:
+                    proctoring_coalescer.remember(group['session_id'], group['log_type'], group['log_id'],
+                                                  group['screenshot_path'], group['last_timestamp'])
+            ProctoringLog._fill_bulk_results(results, groups)
+            
+            logger.info(f"Created {len(new_groups)} proctoring logs in one batch for {len(valid)} events, first ID={first_id}")
+            return results
+            
+        except Exception as e:
+            logger.error(f"Error creating proctoring logs in bulk: {e}")
+            if cursor:
+                cursor.close()
+            for index in valid:
+                if results[index] is None:
+                    results[index] = {'error': str(e), 'retryable': True}
+            return results
+    
+    @staticmethod
+    def _fill_bulk_results(results, groups):
+        for group in groups:
+            # Only the event that inserted a row isn't reported as coalesced
+            for position, index in enumerate(group['indexes']):
+                results[index] = {'log_id': group['log_id']}
+                if position or not group['inserted']:
+                    results[index]['coalesced'] = True
+    
+    @staticmethod
+    def get_logs_by_session(session_id, limit=None, after=None):
+        """
+        Get proctoring logs for a specific session, newest first.
+        
+        Only metadata columns are read. Screenshots stay out of the listing,
+        has_screenshot tells whether get_screenshot can serve one for the log.
+        
+        With `limit`, returns at most that many logs following the (timestamp, id)
+        key `after`, read as a range of idx_logs_session_timestamp.
+        """
+        try:
+            from extensions import mysql
+            if not schema_registry.has_table('proctoring_logs'):
                 logger.error("proctoring_logs table does not exist")
                 return []
             
-            # Get all logs for the session
-            cursor.execute("""
-                SELECT * FROM proctoring_logs
-                WHERE session_id = %s
-                ORDER BY timestamp DESC
-            """, (session_id,))
+            cursor = mysql.connection.cursor()
+            
+            where = ""
+            params = [session_id]
+            if after is not None:
+                where = "AND (timestamp < %s OR (timestamp = %s AND id < %s))"
+                params.extend((after[0], after[0], after[1]))
+            limit_sql = ""
+            if limit is not None:
+                limit_sql = "LIMIT %s"
+                params.append(limit)
+            
+            columns = ['id', 'session_id', 'log_type', 'details', 'timestamp']
+            if schema_registry.has_column('proctoring_logs', 'screenshot_path'):
+                columns.append('screenshot_path')
+            if schema_registry.has_column('proctoring_logs', 'screenshot'):
+                # Legacy inline images, only test for presence so the LONGTEXT isn't transferred
+                columns.append('screenshot IS NOT NULL AS has_inline_screenshot')
+            if schema_registry.has_column('proctoring_logs', 'occurrence_count'):
+                columns.extend(('occurrence_count', 'last_timestamp'))
+            
+            cursor.execute(f"""
+                SELECT {', '.join(columns)} FROM proctoring_logs
+                WHERE session_id = %s {where}
+                ORDER BY timestamp DESC, id DESC
+                {limit_sql}
+            """, params)
             
             results = cursor.fetchall()
             cursor.close()
             
             logs = []
             for row in results:
-                # Create log object safely by checking column existence
-                log_obj = ProctoringLog(
+                screenshot_path = row.get('screenshot_path') or None
+                logs.append(ProctoringLog(
                     id=row.get('id'),
                     session_id=row.get('session_id'),
                     log_type=row.get('log_type'),
                     details=row.get('details'),
-                    timestamp=row.get('timestamp')
-                )
-                
-                # Add screenshot if it exists in the row
-                if 'screenshot' in row and row['screenshot']:
-                    log_obj.screenshot = row['screenshot']
-                    
-                logs.append(log_obj)
+                    timestamp=row.get('timestamp'),
+                    screenshot_path=screenshot_path,
+                    has_screenshot=bool(screenshot_path or row.get('has_inline_screenshot')),
+                    occurrence_count=row.get('occurrence_count'),
+                    last_timestamp=row.get('last_timestamp')
+                ))
                 
             return logs
             
@@ -187,6 +409,64 @@ class ProctoringLog:
                 cursor.close()
             return []
     
+    @staticmethod
+    def get_screenshot(log_id, thumbnail=False):
+        """
+        Locate the screenshot of one log.
+        
+        Returns a dict with 'path' (stored file) or 'bytes' (decoded legacy data URL),
+        plus 'etag', 'mimetype' and 'final'. Stored files fall back from the thumbnail
+        to the original to the archival copy, whichever exists; 'final' is False when
+        a thumbnail was asked for but isn't generated yet, so it shouldn't be cached
+        for long. The archival copy is always final: it is only served once the
+        original is purged, and without the original no thumbnail can be made.
+        Returns None if the log doesn't exist or has no screenshot.
+        """
+        from extensions import mysql
+        import hashlib
+        import mimetypes
+        
+        columns = [column for column in ('screenshot_path', 'screenshot')
+                   if schema_registry.has_column('proctoring_logs', column)]
+        if not columns:
+            return None
+        
+        cursor = mysql.connection.cursor()
+        cursor.execute(f"SELECT {', '.join(columns)} FROM proctoring_logs WHERE id = %s", (log_id,))
+        row = cursor.fetchone()
+        cursor.close()
+        if not row:
+            return None
+        
+        if row.get('screenshot_path'):
+            original = row['screenshot_path']
+            # The original may already be purged in favour of its archival copy
+            archive = derived_path(original, ARCHIVE_SUFFIX)
+            candidates = [original, archive]
+            if thumbnail:
+                candidates.insert(0, derived_path(original, THUMBNAIL_SUFFIX))
+            for candidate in candidates:
+                full_path = ScreenshotStore.get_full_path(candidate)
+                if full_path and os.path.isfile(full_path):
+                    return {
+                        'path': full_path,
+                        # Content hash plus variant suffix, unique per file content
+                        'etag': os.path.basename(full_path),
+                        'mimetype': mimetypes.guess_type(full_path)[0],
+                        'final': candidate in (candidates[0], archive)
+                    }
+        
+        if row.get('screenshot'):
+            image_bytes, extension = ScreenshotStore.decode(row['screenshot'])
+            if image_bytes is not None:
+                return {
+                    'bytes': image_bytes,
+                    'etag': hashlib.sha256(image_bytes).hexdigest(),
+                    'mimetype': mimetypes.guess_type(f"screenshot.{extension}")[0],
+                    'final': True
+                }
+        return None
+    
     @staticmethod
     def get_violations_summary(session_id):
         """
@@ -196,9 +476,12 @@ class ProctoringLog:
             from extensions import mysql
             cursor = mysql.connection.cursor()
             
+            # Coalesced rows stand for occurrence_count events each
+            count_sql = 'SUM(occurrence_count)' if schema_registry.has_column('proctoring_logs', 'occurrence_count') else 'COUNT(*)'
+            
             # Check for suspicious activities
-            cursor.execute("""
-                SELECT log_type, COUNT(*) as count
+            cursor.execute(f"""
+                SELECT log_type, {count_sql} as count
                 FROM proctoring_logs
                 WHERE session_id = %s 
                 AND log_type IN ('multiple_faces', 'face_missing', 'tab_switch', 
@@ -220,7 +503,7 @@ class ProctoringLog:
             
             for row in results:
                 violation_type = row.get('log_type')
-                count = row.get('count', 0)
+                count = int(row.get('count') or 0)
                 if violation_type in violation_summary:
                     violation_summary[violation_type] = count
                     violation_summary['total_violations'] += count
@@ -242,43 +525,201 @@ class ProctoringLog:
             # Create normal log
             log_id = ProctoringLog.create_log(session_id, violation_type, details)
             
-            # Also add to critical violations table if it exists
+            # Also add to critical violations table, created by the schema registry at startup
             from extensions import mysql
+            schema_registry.ensure_loaded()
             cursor = mysql.connection.cursor()
-            
-            # Check if critical_violations table exists
-            cursor.execute("SHOW TABLES LIKE 'critical_violations'")
-            if cursor.fetchone():
-                cursor.execute("""
-                    INSERT INTO critical_violations 
-                    (session_id, violation_type, details, timestamp, needs_review)
-                    VALUES (%s, %s, %s, %s, %s)
-                """, (session_id, violation_type, details, datetime.now(), True))
-                mysql.connection.commit()
-            else:
-                # Create the table if it doesn't exist
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS critical_violations (
-                        id INT AUTO_INCREMENT PRIMARY KEY,
-                        session_id INT NOT NULL,
-                        violation_type VARCHAR(50) NOT NULL,
-                        details TEXT,
-                        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                        needs_review BOOLEAN DEFAULT TRUE
-                    )
-                """)
-                mysql.connection.commit()
-                
-                cursor.execute("""
-                    INSERT INTO critical_violations 
-                    (session_id, violation_type, details, timestamp, needs_review)
-                    VALUES (%s, %s, %s, %s, %s)
-                """, (session_id, violation_type, details, datetime.now(), True))
-                mysql.connection.commit()
-            
+            cursor.execute("""
+                INSERT INTO critical_violations 
+                (session_id, violation_type, details, timestamp, needs_review)
+                VALUES (%s, %s, %s, %s, %s)
+            """, (session_id, violation_type, details, datetime.now(), True))
+            mysql.connection.commit()
             cursor.close()
             return log_id
             
         except Exception as e:
             logger.error(f"Error recording critical violation: {e}")
-            return None
\ No newline at end of file
+            return None
+
+
+class ProctoringLogWriter:
+    """
+    Bounded in-process write-behind queue for proctoring logs.
+    
+    Request threads enqueue events and return immediately. A background flusher
+    thread drains the queue and group-commits the events through
+    ProctoringLog.create_logs_bulk every `batch_size` events or `flush_interval_ms`,
+    whichever comes first.
+    
+    Events that fail because of the database are written again up to
+    `max_retries` times, backing off exponentially from `retry_backoff_ms`,
+    before they are given up on and counted as lost. The flusher doesn't
+    collect new events meanwhile, so an outage fills the queue and new events
+    are rejected at enqueue rather than accepted and lost.
+    
+    Screenshots are written to the screenshot store by the request thread
+    before an event is queued, so the queue holds short paths and its memory
+    stays bounded by `PROCTORING_QUEUE_SIZE` small dicts rather than that
+    many encoded images.
+    """
+    
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = False
+        self.batch_size = 100
+        self.flush_interval = 0.2
+        self.enqueue_timeout = 0.05
+        self.max_retries = 3
+        self.retry_backoff = 0.5
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._atexit_registered = False
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._counters = {
+            'enqueued': 0,
+            'written': 0,
+            'failed': 0,
+            'retried': 0,
+            'lost': 0,
+            'dropped': 0,
+            'flushes': 0
+        }
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('PROCTORING_WRITE_BEHIND', True)
+        self.batch_size = app.config.get('PROCTORING_FLUSH_BATCH_SIZE', 100)
+        self.flush_interval = app.config.get('PROCTORING_FLUSH_INTERVAL_MS', 200) / 1000.0
+        self.enqueue_timeout = app.config.get('PROCTORING_ENQUEUE_TIMEOUT_MS', 50) / 1000.0
+        self.max_retries = app.config.get('PROCTORING_FLUSH_RETRIES', self.max_retries)
+        self.retry_backoff = app.config.get('PROCTORING_FLUSH_RETRY_BACKOFF_MS', 500) / 1000.0
+        self._queue = queue.Queue(maxsize=app.config.get('PROCTORING_QUEUE_SIZE', 10000))
+    
+    def _ensure_started(self):
+        # Started lazily and per process, so forking servers get their own flusher
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name='proctoring-log-writer', daemon=True)
+            self._thread.start()
+            if not self._atexit_registered:
+                atexit.register(self.stop)
+                self._atexit_registered = True
+    
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+    
+    def enqueue(self, event):
+        """
+        Queue one event for writing. Blocks for at most `enqueue_timeout` when the
+        queue is full and returns False if the event had to be dropped.
+        """
+        self._ensure_started()
+        event['received_at'] = datetime.now()
+        screenshot = event.pop('screenshot', None)
+        if screenshot and schema_registry.has_column('proctoring_logs', 'screenshot_path'):
+            event['screenshot_path'] = ProctoringLog._process_screenshot(screenshot, event.get('session_id'), event.get('log_type'))
+        try:
+            self._queue.put(event, timeout=self.enqueue_timeout)
+        except queue.Full:
+            self._count('dropped')
+            logger.warning(f"Proctoring log queue full, dropped event: Type={event.get('log_type')}, Session={event.get('session_id')}")
+            return False
+        self._count('enqueued')
+        return True
+    
+    def _run(self):
+        while not self._stop_event.is_set():
+            batch = self._collect_batch()
+            if batch:
+                self._flush(batch)
+        
+        # Guaranteed flush on shutdown: drain whatever is still queued
+        while True:
+            batch = []
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            if not batch:
+                break
+            self._flush(batch)
+    
+    def _collect_batch(self):
+        """
+        Wait for the first event, then keep collecting until the batch is full
+        or the flush interval has passed
+        """
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+    
+    def _flush(self, batch):
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self.app.app_context():
+                    results = ProctoringLog.create_logs_bulk(batch)
+            except Exception as e:
+                logger.error(f"Error flushing proctoring log queue: {e}")
+                results = [{'error': str(e), 'retryable': True}] * len(batch)
+            self._count('flushes')
+            
+            written = sum(1 for result in results if 'log_id' in result)
+            retry = [event for event, result in zip(batch, results) if result.get('retryable')]
+            self._count('written', written)
+            # Events rejected for their own content would fail again
+            self._count('failed', len(batch) - written - len(retry))
+            if not retry:
+                return
+            
+            batch = retry
+            if attempt < self.max_retries:
+                delay = self.retry_backoff * 2 ** attempt
+                logger.warning(f"Retrying {len(batch)} proctoring log events in {delay:.1f}s")
+                self._count('retried', len(batch))
+                time.sleep(delay)
+        
+        self._count('lost', len(batch))
+        logger.error(f"Gave up on {len(batch)} proctoring log events after {self.max_retries + 1} attempts")
+    
+    def stop(self, timeout=10):
+        """
+        Stop the flusher thread after writing every queued event
+        """
+        self._stop_event.set()
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            self._thread.join(timeout)
+    
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats['queue_depth'] = self._queue.qsize() if self._queue is not None else 0
+        stats['queue_capacity'] = self._queue.maxsize if self._queue is not None else 0
+        return stats
+
+
+# Shared writer instance, initialized in create_app
+proctoring_log_writer = ProctoringLogWriter()
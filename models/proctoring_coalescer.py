@@ -0,0 +1,104 @@
+from collections import OrderedDict
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+class ProctoringEventCoalescer:
+    """
+    Tracks the latest log row of each (session, log type) so repeated events
+    can be folded into it instead of inserting a new row.
+
+    An event matches the tracked row when it arrives within `window_seconds`
+    of the previous occurrence and carries no screenshot, or the same stored
+    screenshot (near-duplicate frames resolve to the earlier image). The row
+    then gets its occurrence_count incremented, last_timestamp and details
+    updated. The window slides with every occurrence, so a steady stream of
+    one violation stays a single row. State lives in process memory, so each
+    worker process coalesces the events it ingests; keys are evicted least
+    recently used.
+    """
+
+    def __init__(self, app=None):
+        self.window_seconds = 30
+        self.max_keys = 50000
+        self._runs = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {'inserted': 0, 'coalesced': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.window_seconds = app.config.get('PROCTORING_COALESCE_WINDOW_SECONDS', self.window_seconds)
+        self.max_keys = app.config.get('PROCTORING_COALESCE_MAX_KEYS', self.max_keys)
+
+    @property
+    def enabled(self):
+        return self.window_seconds > 0
+
+    def match(self, session_id, log_type, screenshot_path, timestamp):
+        """
+        Return (log_id, screenshot_path) of the row this event can be merged
+        into, or None. A match extends the run to `timestamp`.
+        """
+        if not self.enabled:
+            return None
+        key = (str(session_id), log_type)
+        with self._lock:
+            run = self._runs.get(key)
+            if run is None:
+                return None
+            log_id, run_screenshot, last_seen = run
+            if not self.continues(run_screenshot, last_seen, screenshot_path, timestamp):
+                return None
+            self._runs[key] = (log_id, run_screenshot, max(last_seen, timestamp))
+            self._runs.move_to_end(key)
+            self._counters['coalesced'] += 1
+            return log_id, run_screenshot
+
+    def continues(self, run_screenshot, last_seen, screenshot_path, timestamp):
+        """
+        Whether an event extends a run last seen at `last_seen` on a row holding `run_screenshot`
+        """
+        # Out of order timestamps from the write-behind queue count as inside the window
+        if (timestamp - last_seen).total_seconds() > self.window_seconds:
+            return False
+        return not screenshot_path or screenshot_path == run_screenshot
+
+    def remember(self, session_id, log_type, log_id, screenshot_path, timestamp):
+        """
+        Start a new run at a freshly inserted row
+        """
+        if not self.enabled or not log_id:
+            return
+        key = (str(session_id), log_type)
+        with self._lock:
+            self._runs[key] = (log_id, screenshot_path, timestamp)
+            self._runs.move_to_end(key)
+            self._counters['inserted'] += 1
+            while len(self._runs) > self.max_keys:
+                self._runs.popitem(last=False)
+
+    def forget(self, session_id, log_type, log_id):
+        """
+        Drop a run whose row has disappeared, e.g. deleted with its session
+        """
+        key = (str(session_id), log_type)
+        with self._lock:
+            run = self._runs.get(key)
+            if run is not None and run[0] == log_id:
+                del self._runs[key]
+                # The match that found this run didn't fold anything into it
+                self._counters['coalesced'] -= 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['tracked'] = len(self._runs)
+        stats['enabled'] = self.enabled
+        stats['window_seconds'] = self.window_seconds
+        return stats
+
+
+# Shared coalescer, configured in create_app
+proctoring_coalescer = ProctoringEventCoalescer()
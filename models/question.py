@@ -1,4 +1,9 @@
+from models.exam import Exam
+from models.row_mapper import make_row_mapper
+
 class Question:
+    __slots__ = ('id', 'exam_id', 'question_text', 'option_a', 'option_b', 'option_c', 'option_d', 'correct_option', 'marks')
+
     def __init__(self, id, exam_id, question_text, option_a, option_b, option_c, option_d, correct_option, marks):
         self.id = id
         self.exam_id = exam_id
@@ -19,17 +24,7 @@ class Question:
         cursor.close()
         
         if question_data:
-            return Question(
-                id=question_data['id'],
-                exam_id=question_data['exam_id'],
-                question_text=question_data['question_text'],
-                option_a=question_data['option_a'],
-                option_b=question_data['option_b'],
-                option_c=question_data['option_c'],
-                option_d=question_data['option_d'],
-                correct_option=question_data['correct_option'],
-                marks=question_data['marks']
-            )
+            return Question.from_row(question_data)
         return None
     
     @staticmethod
@@ -40,42 +35,33 @@ class Question:
         questions_data = cursor.fetchall()
         cursor.close()
         
-        questions = []
-        for question_data in questions_data:
-            questions.append(Question(
-                id=question_data['id'],
-                exam_id=question_data['exam_id'],
-                question_text=question_data['question_text'],
-                option_a=question_data['option_a'],
-                option_b=question_data['option_b'],
-                option_c=question_data['option_c'],
-                option_d=question_data['option_d'],
-                correct_option=question_data['correct_option'],
-                marks=question_data['marks']
-            ))
-        return questions
+        return [Question.from_row(question_data) for question_data in questions_data]
         
     def to_dict(self):
         """Convert the Question object to a dictionary for JSON serialization"""
-        # Create a dictionary of all attributes that don't start with underscore
-        result = {}
-        for key in dir(self):
-            # Skip private attributes and methods
-            if key.startswith('_') or callable(getattr(self, key)):
-                continue
-            
-            # Add attribute to dictionary if it's a basic type that can be serialized
-            value = getattr(self, key)
-            try:
-                # Test if value is JSON serializable
-                import json
-                json.dumps(value)
-                result[key] = value
-            except (TypeError, OverflowError):
-                # If it's not serializable, convert to string
-                result[key] = str(value)
-        
-        return result
+        return {
+            'id': self.id,
+            'exam_id': self.exam_id,
+            'question_text': self.question_text,
+            'option_a': self.option_a,
+            'option_b': self.option_b,
+            'option_c': self.option_c,
+            'option_d': self.option_d,
+            'correct_option': self.correct_option,
+            'marks': self.marks
+        }
+    
+    @staticmethod
+    def invalidate_exam_caches(exam_id):
+        """
+        Drop the exam's compiled answer key, serialized paper and statistics after a question change
+        """
+        from models.exam_paper import exam_paper_cache
+        from models.exam_stats import ExamStatistics
+        from models.grading import answer_key_cache
+        answer_key_cache.invalidate(exam_id)
+        exam_paper_cache.invalidate(exam_id)
+        ExamStatistics.invalidate(exam_id)
         
     @staticmethod
     def create_question(exam_id, question_text, option_a, option_b, option_c, option_d, correct_option, marks):
@@ -100,6 +86,58 @@ class Question:
             VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
         """, (exam_id, question_text, option_a, option_b, option_c, option_d, shortened_option, marks))
         question_id = cursor.lastrowid
+        Exam.bump_question_version(cursor, exam_id)
+        mysql.connection.commit()
+        cursor.close()
+        
+        # The exam's compiled answer key and paper are now outdated
+        Question.invalidate_exam_caches(exam_id)
+        return question_id
+    
+    @staticmethod
+    def update_question(question_id, question_text, option_a, option_b, option_c, option_d, correct_option, marks):
+        from extensions import mysql
+        from models.grading import GradingEngine
+        
+        cursor = mysql.connection.cursor()
+        cursor.execute("SELECT exam_id FROM questions WHERE id = %s", (question_id,))
+        question_data = cursor.fetchone()
+        if not question_data:
+            cursor.close()
+            return False
+        
+        cursor.execute("""
+            UPDATE questions
+            SET question_text = %s, option_a = %s, option_b = %s, option_c = %s, option_d = %s,
+                correct_option = %s, marks = %s
+            WHERE id = %s
+        """, (question_text, option_a, option_b, option_c, option_d,
+              GradingEngine.normalize_option(correct_option), marks, question_id))
+        Exam.bump_question_version(cursor, question_data['exam_id'])
         mysql.connection.commit()
         cursor.close()
-        return question_id
\ No newline at end of file
+        
+        Question.invalidate_exam_caches(question_data['exam_id'])
+        return True
+    
+    @staticmethod
+    def delete_question(question_id):
+        from extensions import mysql
+        
+        cursor = mysql.connection.cursor()
+        cursor.execute("SELECT exam_id FROM questions WHERE id = %s", (question_id,))
+        question_data = cursor.fetchone()
+        if not question_data:
+            cursor.close()
+            return False
+        
+        cursor.execute("DELETE FROM questions WHERE id = %s", (question_id,))
+        Exam.bump_question_version(cursor, question_data['exam_id'])
+        mysql.connection.commit()
+        cursor.close()
+        
+        Question.invalidate_exam_caches(question_data['exam_id'])
+        return True
+
+
+Question.from_row = staticmethod(make_row_mapper(Question, Question.__slots__))
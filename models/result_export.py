@@ -0,0 +1,87 @@
+import csv
+import io
+
+from models.exam_session import ExamSession
+
+RESULT_COLUMNS = ('Student Name', 'Start Time', 'End Time', 'Score', 'Total Marks', 'Percentage', 'Status')
+
+# Fixed widths, constant memory mode can't measure columns after the rows are written
+RESULT_COLUMN_WIDTHS = (24, 18, 18, 8, 12, 12, 10)
+
+class ResultExporter:
+    """
+    Writes exam results as CSV or XLSX while reading them chunk by chunk
+    from a server-side cursor, so memory stays bounded by the chunk size.
+    """
+
+    @staticmethod
+    def format_row(result, total_marks):
+        score = result['score'] or 0
+        ratio = score / total_marks if total_marks > 0 else 0
+        status = 'Pass' if ratio >= 0.7 else 'Average' if ratio >= 0.4 else 'Fail'
+        return (
+            result['student_name'],
+            ResultExporter._format_time(result['start_time']),
+            ResultExporter._format_time(result['end_time']),
+            score,
+            total_marks,
+            round(ratio * 100),
+            status
+        )
+
+    @staticmethod
+    def _format_time(value):
+        return value.strftime('%Y-%m-%d %H:%M') if hasattr(value, 'strftime') else value
+
+    @staticmethod
+    def iter_csv(exam_id, total_marks, chunk_size=1000):
+        """
+        Yield the CSV export one encoded chunk at a time
+        """
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(RESULT_COLUMNS)
+
+        for rows in ExamSession.iter_results_by_exam(exam_id, chunk_size):
+            writer.writerows(ResultExporter.format_row(row, total_marks) for row in rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    @staticmethod
+    def write_xlsx(output, exam_id, total_marks, chunk_size=1000):
+        """
+        Write the XLSX export to the file object `output`.
+
+        constant_memory makes xlsxwriter flush each row to a temporary file as
+        soon as the next one starts, so only the current chunk is held in memory.
+        """
+        import xlsxwriter
+
+        workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+        worksheet = workbook.add_worksheet('Results')
+
+        header_format = workbook.add_format({'bold': True, 'bg_color': '#4472C4', 'color': 'white'})
+        status_formats = {
+            'Pass': workbook.add_format({'bg_color': '#C6EFCE'}),
+            'Average': workbook.add_format({'bg_color': '#FFEB9C'}),
+            'Fail': workbook.add_format({'bg_color': '#FFC7CE'})
+        }
+        status_column = RESULT_COLUMNS.index('Status')
+
+        for column, width in enumerate(RESULT_COLUMN_WIDTHS):
+            worksheet.set_column(column, column, width)
+        worksheet.write_row(0, 0, RESULT_COLUMNS, header_format)
+
+        row_number = 1
+        for rows in ExamSession.iter_results_by_exam(exam_id, chunk_size):
+            for row in rows:
+                values = ResultExporter.format_row(row, total_marks)
+                worksheet.write_row(row_number, 0, values[:status_column])
+                worksheet.write(row_number, status_column, values[status_column], status_formats[values[status_column]])
+                row_number += 1
+
+        workbook.close()
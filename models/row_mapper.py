@@ -0,0 +1,24 @@
+def make_row_mapper(cls, fields, optional=()):
+    """
+    Generate a function that builds a `cls` instance straight from a DictCursor row.
+
+    `fields` must be present in the row, `optional` fields (joined columns such
+    as student_name) are read with .get() and default to None. The mapper is
+    compiled once per model so each row costs a fixed set of slot stores,
+    without going through __init__ keyword arguments.
+    """
+    lines = [
+        "def from_row(row, _new=object.__new__, _cls=cls):",
+        "    obj = _new(_cls)"
+    ]
+    for field in fields:
+        lines.append(f"    obj.{field} = row[{field!r}]")
+    for field in optional:
+        lines.append(f"    obj.{field} = row.get({field!r})")
+    lines.append("    return obj")
+
+    namespace = {'cls': cls}
+    exec('\n'.join(lines), namespace)
+    from_row = namespace['from_row']
+    from_row.__qualname__ = f"{cls.__name__}.from_row"
+    return from_row
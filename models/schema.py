@@ -0,0 +1,203 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Tables the models create on demand if a deployment doesn't have them yet
+MANAGED_TABLES = {
+    'proctoring_logs': """
+        CREATE TABLE IF NOT EXISTS proctoring_logs (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            session_id INT NOT NULL,
+            log_type VARCHAR(50) NOT NULL,
+            details TEXT,
+            screenshot LONGTEXT,
+            screenshot_path VARCHAR(255),
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            occurrence_count INT NOT NULL DEFAULT 1,
+            last_timestamp DATETIME,
+            FOREIGN KEY (session_id) REFERENCES exam_sessions(id) ON DELETE CASCADE
+        )
+    """,
+    'critical_violations': """
+        CREATE TABLE IF NOT EXISTS critical_violations (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            session_id INT NOT NULL,
+            violation_type VARCHAR(50) NOT NULL,
+            details TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            needs_review BOOLEAN DEFAULT TRUE
+        )
+    """,
+    'answer_drafts': """
+        CREATE TABLE IF NOT EXISTS answer_drafts (
+            session_id INT NOT NULL,
+            question_id INT NOT NULL,
+            selected_option CHAR(1) NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            PRIMARY KEY (session_id, question_id),
+            FOREIGN KEY (session_id) REFERENCES exam_sessions(id) ON DELETE CASCADE
+        )
+    """,
+    'grading_jobs': """
+        CREATE TABLE IF NOT EXISTS grading_jobs (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            session_id INT NOT NULL UNIQUE,
+            answers MEDIUMTEXT,
+            status VARCHAR(20) NOT NULL DEFAULT 'queued',
+            attempts INT NOT NULL DEFAULT 0,
+            claim_token CHAR(32),
+            score FLOAT,
+            error TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            started_at DATETIME,
+            finished_at DATETIME,
+            INDEX idx_grading_jobs_status (status, id),
+            INDEX idx_grading_jobs_claim (claim_token),
+            FOREIGN KEY (session_id) REFERENCES exam_sessions(id) ON DELETE CASCADE
+        )
+    """,
+    'proctoring_logs_backup': """
+        CREATE TABLE IF NOT EXISTS proctoring_logs_backup (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            session_id INT NOT NULL,
+            log_type VARCHAR(50) NOT NULL,
+            details TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """
+}
+
+# Tables added by setup_database.py migrations. They are only inspected, never
+# created here, because they need a backfill that only the migration performs.
+MIGRATED_TABLES = (
+    'student_summaries',
+    'exam_stats',
+)
+
+# Base tables inspected for columns that later migrations add
+INSPECTED_TABLES = (
+    'exams',
+)
+
+class SchemaRegistry:
+    """
+    Inspects (and creates, if missing) the managed tables once and caches
+    their column names, so models don't need SHOW TABLES probes per request.
+    Migrated tables are inspected too, so models can tell whether they exist.
+
+    setup_database.py can add tables and columns while the app is running, so
+    a missing table or column is looked up again, at most once per
+    `recheck_interval` seconds. Callers about to write rows that a migration
+    backfills pass fresh=True to look again on every miss, so no worker keeps
+    skipping those writes once the table exists.
+    """
+
+    def __init__(self, app=None):
+        self.loaded = False
+        self.recheck_interval = 30
+        self._tables = {}
+        self._checked_at = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.recheck_interval = app.config.get('SCHEMA_RECHECK_INTERVAL', self.recheck_interval)
+        try:
+            with app.app_context():
+                self.load()
+        except Exception as e:
+            # The database may not be reachable yet, the first request will retry
+            logger.error(f"Could not load database schema at startup: {e}")
+
+    def load(self):
+        """
+        Create missing managed tables and cache the columns of each one.
+        Must be called inside an application context.
+        """
+        from extensions import mysql
+
+        with self._lock:
+            cursor = mysql.connection.cursor()
+            tables = {}
+            for table_name, create_sql in MANAGED_TABLES.items():
+                cursor.execute("SHOW TABLES LIKE %s", (table_name,))
+                if not cursor.fetchone():
+                    logger.warning(f"{table_name} table does not exist, creating it")
+                    cursor.execute(create_sql)
+                    mysql.connection.commit()
+
+                tables[table_name] = self._inspect(cursor, table_name)
+
+            for table_name in MIGRATED_TABLES + INSPECTED_TABLES:
+                columns = self._inspect(cursor, table_name)
+                if columns is None:
+                    logger.warning(f"{table_name} table does not exist, run setup_database.py to create it")
+                    continue
+                tables[table_name] = columns
+            cursor.close()
+
+            now = time.monotonic()
+            self._tables = tables
+            self._checked_at = dict.fromkeys(tuple(MANAGED_TABLES) + MIGRATED_TABLES + INSPECTED_TABLES, now)
+            self.loaded = True
+            logger.info(f"Schema registry loaded: {', '.join(sorted(tables))}")
+
+    @staticmethod
+    def _inspect(cursor, table_name):
+        """
+        Column names of a table, or None if it doesn't exist
+        """
+        cursor.execute("SHOW TABLES LIKE %s", (table_name,))
+        if not cursor.fetchone():
+            return None
+        cursor.execute(f"SHOW COLUMNS FROM {table_name}")
+        return frozenset(row['Field'] for row in cursor.fetchall())
+
+    def _recheck(self, table_name, fresh):
+        """
+        Inspect one table again after a miss, unless that was done less than recheck_interval seconds ago
+        """
+        from extensions import mysql
+
+        now = time.monotonic()
+        checked_at = self._checked_at.get(table_name)
+        if not fresh and checked_at is not None and now - checked_at < self.recheck_interval:
+            return
+        cursor = mysql.connection.cursor()
+        columns = self._inspect(cursor, table_name)
+        cursor.close()
+
+        with self._lock:
+            self._checked_at[table_name] = now
+            if columns is not None and columns != self._tables.get(table_name):
+                tables = dict(self._tables)
+                tables[table_name] = columns
+                self._tables = tables
+                logger.info(f"Schema registry picked up changes to {table_name}")
+
+    def ensure_loaded(self):
+        if not self.loaded:
+            self.load()
+
+    def has_table(self, table_name, fresh=False):
+        self.ensure_loaded()
+        if table_name not in self._tables:
+            self._recheck(table_name, fresh)
+        return table_name in self._tables
+
+    def has_column(self, table_name, column_name, fresh=False):
+        self.ensure_loaded()
+        if column_name not in self._tables.get(table_name, ()):
+            self._recheck(table_name, fresh)
+        return column_name in self._tables.get(table_name, ())
+
+    def columns(self, table_name):
+        self.ensure_loaded()
+        return self._tables.get(table_name, frozenset())
+
+
+# Shared registry instance, loaded in create_app
+schema_registry = SchemaRegistry()
@@ -0,0 +1,129 @@
+from collections import OrderedDict, deque
+import io
+import logging
+import threading
+import time
+
+# Pillow is optional, without it every screenshot is stored
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# dHash compares horizontally adjacent pixels of a 9x8 grayscale image, giving 64 bits
+HASH_WIDTH = 9
+HASH_HEIGHT = 8
+
+def perceptual_hash(image_bytes):
+    """
+    64-bit difference hash of an encoded image, or None if it can't be decoded.
+
+    JPEG draft mode lets the decoder scale down by up to 8x while decoding, so
+    hashing a 1280x720 frame never materializes the full-size image.
+    """
+    if Image is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            image.draft('L', (HASH_WIDTH * 8, HASH_HEIGHT * 8))
+            small = image.convert('L').resize((HASH_WIDTH, HASH_HEIGHT))
+            pixels = small.tobytes()
+    except Exception as e:
+        logger.warning(f"Could not hash screenshot: {e}")
+        return None
+
+    value = 0
+    for row in range(HASH_HEIGHT):
+        offset = row * HASH_WIDTH
+        for column in range(HASH_WIDTH - 1):
+            value = (value << 1) | (pixels[offset + column] > pixels[offset + column + 1])
+    return value
+
+
+def hamming_distance(first, second):
+    return bin(first ^ second).count('1')
+
+
+class NearDuplicateFilter:
+    """
+    Window of recently stored screenshot hashes per (session, log type).
+
+    A frame whose hash is within `max_distance` bits of a frame stored for the
+    same session and log type in the last `window_size` frames and
+    `window_seconds` seconds is not stored again, its log row references the
+    earlier image instead. Keying by log type like the coalescer keeps a
+    burst of one violation from pushing other violations' frames out of the
+    window, and keeps evidence of one violation from standing in for another.
+    Windows live in process memory, so each worker process dedupes the
+    events it ingests; windows are evicted least recently used.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.max_distance = 6
+        self.window_size = 8
+        self.window_seconds = 300
+        self.max_windows = 10000
+        self._windows = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {'checked': 0, 'suppressed': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('SCREENSHOT_DEDUP_ENABLED', True)
+        if self.enabled and Image is None:
+            logger.warning("Pillow is not installed, near-duplicate screenshot detection is disabled")
+            self.enabled = False
+        self.max_distance = app.config.get('SCREENSHOT_DEDUP_MAX_DISTANCE', self.max_distance)
+        self.window_size = app.config.get('SCREENSHOT_DEDUP_WINDOW', self.window_size)
+        self.window_seconds = app.config.get('SCREENSHOT_DEDUP_WINDOW_SECONDS', self.window_seconds)
+        self.max_windows = app.config.get('SCREENSHOT_DEDUP_MAX_WINDOWS', self.max_windows)
+
+    def find(self, session_id, log_type, image_hash):
+        """
+        Return the stored path of a recent near-identical frame of the session's log type, or None
+        """
+        if image_hash is None:
+            return None
+        key = (session_id, log_type)
+        now = time.monotonic()
+        with self._lock:
+            self._counters['checked'] += 1
+            window = self._windows.get(key)
+            if not window:
+                return None
+            self._windows.move_to_end(key)
+            for stored_hash, relative_path, stored_at in reversed(window):
+                if now - stored_at > self.window_seconds:
+                    break
+                if hamming_distance(stored_hash, image_hash) <= self.max_distance:
+                    self._counters['suppressed'] += 1
+                    return relative_path
+        return None
+
+    def remember(self, session_id, log_type, image_hash, relative_path):
+        if image_hash is None or not relative_path:
+            return
+        key = (session_id, log_type)
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None:
+                window = self._windows[key] = deque(maxlen=self.window_size)
+            self._windows.move_to_end(key)
+            window.append((image_hash, relative_path, time.monotonic()))
+            while len(self._windows) > self.max_windows:
+                self._windows.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['windows'] = len(self._windows)
+        stats['enabled'] = self.enabled
+        return stats
+
+
+# Shared filter, configured in create_app
+near_duplicate_filter = NearDuplicateFilter()
@@ -0,0 +1,228 @@
+from concurrent.futures import ProcessPoolExecutor
+import atexit
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+
+# Pillow is optional, without it screenshots are kept as uploaded
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Suffixes of the files derived from an original <hash>.<ext>
+THUMBNAIL_SUFFIX = '.thumb.jpg'
+ARCHIVE_SUFFIX = '.archive.jpg'
+
+def derived_path(relative_path, suffix):
+    """
+    Path of a derived image next to its original, e.g. ab/cd/<hash>.jpg -> ab/cd/<hash>.thumb.jpg
+    """
+    return os.path.splitext(relative_path)[0] + suffix
+
+
+def is_original(filename):
+    return not filename.endswith((THUMBNAIL_SUFFIX, ARCHIVE_SUFFIX, '.tmp'))
+
+
+def _write_jpeg(image, full_path, quality):
+    # Same temp file + rename as ScreenshotStore, readers never see a partial image
+    directory = os.path.dirname(full_path)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            image.save(temp_file, 'JPEG', quality=quality, optimize=True, progressive=True)
+        os.replace(temp_path, full_path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def transcode_screenshot(root, relative_path, thumbnail_size, thumbnail_quality, archive_quality):
+    """
+    Worker process entry point: write the thumbnail and the recompressed archival
+    copy of one stored screenshot. Files that already exist are left alone, so
+    resubmitting a content-addressed image is free. Returns the number of files written.
+    """
+    original = os.path.join(root, relative_path)
+    targets = [
+        (os.path.join(root, derived_path(relative_path, THUMBNAIL_SUFFIX)), thumbnail_quality, True),
+        (os.path.join(root, derived_path(relative_path, ARCHIVE_SUFFIX)), archive_quality, False)
+    ]
+    targets = [target for target in targets if not os.path.exists(target[0])]
+    if not targets or not os.path.isfile(original):
+        return 0
+
+    with Image.open(original) as source:
+        source = source.convert('RGB')
+        for full_path, quality, thumbnail in targets:
+            image = source
+            if thumbnail:
+                image = source.copy()
+                image.thumbnail(thumbnail_size)
+            _write_jpeg(image, full_path, quality)
+    return len(targets)
+
+
+def purge_originals(root, max_age):
+    """
+    Worker process entry point: delete originals older than `max_age` seconds
+    whose archival copy exists. Returns the number of files removed.
+    """
+    cutoff = time.time() - max_age
+    removed = 0
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            if not is_original(filename):
+                continue
+            full_path = os.path.join(directory, filename)
+            archive = os.path.splitext(full_path)[0] + ARCHIVE_SUFFIX
+            try:
+                if os.path.getmtime(full_path) < cutoff and os.path.exists(archive):
+                    os.remove(full_path)
+                    removed += 1
+            except OSError:
+                # Removed concurrently or unreadable, try again on the next purge
+                continue
+    return removed
+
+
+class ScreenshotPipeline:
+    """
+    Background thumbnailing and transcoding of stored proctoring screenshots.
+
+    Each newly stored original is handed to a ProcessPoolExecutor, so the CPU
+    bound image work runs outside the request and writer threads and outside
+    the GIL. Originals whose archival copy exists are purged once they are
+    older than SCREENSHOT_ORIGINAL_RETENTION_HOURS, checked at most every
+    SCREENSHOT_PURGE_INTERVAL seconds.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.max_workers = 2
+        self.thumbnail_size = (320, 180)
+        self.thumbnail_quality = 60
+        self.archive_quality = 50
+        self.retention = 24 * 3600
+        self.purge_interval = 3600
+        self._root = None
+        self._executor = None
+        self._pid = None
+        self._pending = set()
+        self._last_purge = 0
+        self._atexit_registered = False
+        self._lock = threading.Lock()
+        self._counters = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'files_written': 0,
+            'originals_purged': 0
+        }
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('SCREENSHOT_PIPELINE_ENABLED', True)
+        if self.enabled and Image is None:
+            logger.warning("Pillow is not installed, screenshot thumbnails are disabled")
+            self.enabled = False
+        self.max_workers = app.config.get('SCREENSHOT_PIPELINE_WORKERS', 2)
+        self.thumbnail_size = tuple(app.config.get('SCREENSHOT_THUMBNAIL_SIZE', self.thumbnail_size))
+        self.thumbnail_quality = app.config.get('SCREENSHOT_THUMBNAIL_QUALITY', self.thumbnail_quality)
+        self.archive_quality = app.config.get('SCREENSHOT_ARCHIVE_QUALITY', self.archive_quality)
+        self.retention = app.config.get('SCREENSHOT_ORIGINAL_RETENTION_HOURS', 24) * 3600
+        self.purge_interval = app.config.get('SCREENSHOT_PURGE_INTERVAL', self.purge_interval)
+        with app.app_context():
+            from models.screenshot_store import ScreenshotStore
+            self._root = ScreenshotStore.get_root()
+
+    def _get_executor(self):
+        # Created lazily and per process, forked workers must not share the parent's pool
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._pending.clear()
+                # spawn, so children don't inherit the threads and sockets of the web process
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+                if not self._atexit_registered:
+                    atexit.register(self.shutdown)
+                    self._atexit_registered = True
+            return self._executor
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def submit(self, relative_path):
+        """
+        Queue thumbnail and archive generation for a stored original, never raises
+        """
+        if not self.enabled or not relative_path:
+            return
+        try:
+            executor = self._get_executor()
+            with self._lock:
+                if relative_path in self._pending:
+                    return
+                self._pending.add(relative_path)
+            future = executor.submit(transcode_screenshot, self._root, relative_path, self.thumbnail_size,
+                                     self.thumbnail_quality, self.archive_quality)
+            self._count('submitted')
+            future.add_done_callback(lambda done: self._transcoded(relative_path, done))
+            self._maybe_purge(executor)
+        except Exception as e:
+            with self._lock:
+                self._pending.discard(relative_path)
+            logger.error(f"Could not queue screenshot {relative_path} for transcoding: {e}")
+
+    def _transcoded(self, relative_path, future):
+        with self._lock:
+            self._pending.discard(relative_path)
+        try:
+            self._count('files_written', future.result())
+            self._count('completed')
+        except Exception as e:
+            logger.error(f"Failed to transcode screenshot {relative_path}: {e}")
+            self._count('failed')
+
+    def _maybe_purge(self, executor):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_purge < self.purge_interval:
+                return
+            self._last_purge = now
+        future = executor.submit(purge_originals, self._root, self.retention)
+        future.add_done_callback(self._purged)
+
+    def _purged(self, future):
+        try:
+            self._count('originals_purged', future.result())
+        except Exception as e:
+            logger.error(f"Failed to purge screenshot originals: {e}")
+
+    def shutdown(self):
+        with self._lock:
+            executor = self._executor if self._pid == os.getpid() else None
+            self._executor = None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['pending'] = len(self._pending)
+        stats['enabled'] = self.enabled
+        return stats
+
+
+# Shared pipeline, configured in create_app
+screenshot_pipeline = ScreenshotPipeline()
@@ -0,0 +1,130 @@
+import base64
+import binascii
+import hashlib
+import logging
+import os
+import re
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+# data:image/<type>;base64,<payload>
+DATA_URL_PATTERN = re.compile(r'^data:image/(?P<type>[a-zA-Z0-9.+-]+);base64,(?P<data>.*)$', re.DOTALL)
+
+# Image types accepted from the browser, mapped to the file extension used on disk
+IMAGE_EXTENSIONS = {
+    'jpeg': 'jpg',
+    'jpg': 'jpg',
+    'png': 'png',
+    'webp': 'webp'
+}
+
+class ScreenshotStore:
+    """
+    Content-addressed on-disk store for proctoring screenshots.
+
+    Images are decoded once and written as raw bytes under
+    <SCREENSHOT_FOLDER>/<hash[0:2]>/<hash[2:4]>/<hash>.<ext>, so identical
+    frames share a single file. Only the relative path is kept in the database.
+    """
+
+    @staticmethod
+    def get_root():
+        from flask import current_app
+        root = current_app.config.get('SCREENSHOT_FOLDER')
+        if not root:
+            root = os.path.join(current_app.config['UPLOAD_FOLDER'], 'screenshots')
+        return root
+
+    @staticmethod
+    def decode(screenshot):
+        """
+        Decode a data URL (or raw bytes) into (image_bytes, extension).
+        Returns (None, None) if the screenshot cannot be decoded.
+        """
+        if not screenshot:
+            return None, None
+
+        if isinstance(screenshot, (bytes, bytearray)):
+            # Raw bytes are assumed to be a JPEG frame, like the canvas captures
+            return bytes(screenshot), 'jpg'
+
+        if not isinstance(screenshot, str):
+            logger.error(f"Unsupported screenshot type: {type(screenshot)}")
+            return None, None
+
+        match = DATA_URL_PATTERN.match(screenshot)
+        if not match:
+            logger.error("Screenshot is not a base64 image data URL")
+            return None, None
+
+        extension = IMAGE_EXTENSIONS.get(match.group('type').lower())
+        if not extension:
+            logger.error(f"Unsupported screenshot image type: {match.group('type')}")
+            return None, None
+
+        try:
+            image_bytes = base64.b64decode(match.group('data'), validate=True)
+        except (binascii.Error, ValueError) as e:
+            logger.error(f"Failed to decode screenshot: {e}")
+            return None, None
+
+        if not image_bytes:
+            return None, None
+        return image_bytes, extension
+
+    @staticmethod
+    def relative_path(content_hash, extension):
+        return os.path.join(content_hash[:2], content_hash[2:4], f"{content_hash}.{extension}")
+
+    @staticmethod
+    def save(screenshot):
+        """
+        Store a screenshot and return its path relative to the store root,
+        or None if there was nothing valid to store.
+        """
+        image_bytes, extension = ScreenshotStore.decode(screenshot)
+        if image_bytes is None:
+            return None
+
+        return ScreenshotStore.save_bytes(image_bytes, extension)
+
+    @staticmethod
+    def save_bytes(image_bytes, extension='jpg'):
+        """
+        Store already decoded image bytes and return the relative path
+        """
+        content_hash = hashlib.sha256(image_bytes).hexdigest()
+        relative_path = ScreenshotStore.relative_path(content_hash, extension)
+        full_path = os.path.join(ScreenshotStore.get_root(), relative_path)
+
+        # Identical frames dedupe to the same file
+        if os.path.exists(full_path):
+            return relative_path
+
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+
+        # Write to a temporary file first so readers never see a partial image
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                temp_file.write(image_bytes)
+            os.replace(temp_path, full_path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        return relative_path
+
+    @staticmethod
+    def get_full_path(relative_path):
+        """
+        Resolve a stored relative path, refusing anything outside the store root
+        """
+        root = os.path.abspath(ScreenshotStore.get_root())
+        full_path = os.path.abspath(os.path.join(root, relative_path))
+        if os.path.commonpath([root, full_path]) != root:
+            return None
+        return full_path
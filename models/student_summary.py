@@ -0,0 +1,93 @@
+from extensions import mysql
+from models.schema import schema_registry
+
+class StudentSummary:
+    """
+    Per-student rollup of completed exams, kept in student_summaries and
+    updated in the same transaction that completes a session.
+    """
+
+    def __init__(self, student_id, completed_count=0, score_sum=0, score_count=0, last_completed_at=None):
+        self.student_id = student_id
+        self.completed_count = completed_count
+        self.score_sum = score_sum
+        self.score_count = score_count
+        self.last_completed_at = last_completed_at
+
+    @property
+    def average_score(self):
+        if not self.score_count:
+            return None
+        return float(self.score_sum) / self.score_count
+
+    @staticmethod
+    def is_available(fresh=False):
+        return schema_registry.has_table('student_summaries', fresh)
+
+    @staticmethod
+    def get(student_id):
+        cursor = mysql.connection.cursor()
+        cursor.execute("""
+            SELECT student_id, completed_count, score_sum, score_count, last_completed_at
+            FROM student_summaries
+            WHERE student_id = %s
+        """, (student_id,))
+        row = cursor.fetchone()
+        cursor.close()
+
+        if row:
+            return StudentSummary(
+                student_id=row['student_id'],
+                completed_count=row['completed_count'],
+                score_sum=row['score_sum'],
+                score_count=row['score_count'],
+                last_completed_at=row['last_completed_at']
+            )
+        return StudentSummary(student_id)
+
+    @staticmethod
+    def record_completion(cursor, student_id, score, completed_at):
+        """
+        Add one completed session to the student's summary on the caller's transaction
+        """
+        # Looked up again on a miss, so no completion is lost once the migration has backfilled the table
+        if not StudentSummary.is_available(fresh=True):
+            return
+        cursor.execute("""
+            INSERT INTO student_summaries (student_id, completed_count, score_sum, score_count, last_completed_at)
+            VALUES (%s, 1, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                completed_count = completed_count + 1,
+                score_sum = score_sum + VALUES(score_sum),
+                score_count = score_count + VALUES(score_count),
+                last_completed_at = GREATEST(COALESCE(last_completed_at, VALUES(last_completed_at)), VALUES(last_completed_at))
+        """, (student_id, score or 0, 1 if score is not None else 0, completed_at))
+
+    @staticmethod
+    def rebuild(cursor, student_ids=None):
+        """
+        Recompute summaries from exam_sessions, for all students or just the given ones
+        """
+        if not StudentSummary.is_available(fresh=True):
+            return
+        where = ""
+        params = []
+        if student_ids is not None:
+            student_ids = list(student_ids)
+            if not student_ids:
+                return
+            where = f"AND student_id IN ({', '.join(['%s'] * len(student_ids))})"
+            params = student_ids
+
+        cursor.execute(f"""
+            INSERT INTO student_summaries (student_id, completed_count, score_sum, score_count, last_completed_at)
+            SELECT student_id, COUNT(*), COALESCE(SUM(score), 0), COUNT(score), MAX(end_time)
+            FROM exam_sessions
+            WHERE status = 'completed' {where}
+            GROUP BY student_id
+            ON DUPLICATE KEY UPDATE
+                completed_count = VALUES(completed_count),
+                score_sum = VALUES(score_sum),
+                score_count = VALUES(score_count),
+                last_completed_at = VALUES(last_completed_at)
+        """, params)
@@ -1,8 +1,15 @@
 from flask import current_app
-from flask_login import UserMixin
 from extensions import mysql
+from models.cache import TTLCache
+from models.row_mapper import make_row_mapper
+
+# Non-secret user fields by id, so load_user doesn't hit the database on every request
+user_cache = TTLCache(max_size=10000, ttl=60)
+
+class User:
+    # flask_login.UserMixin has no __slots__, so its interface is implemented here instead
+    __slots__ = ('id', 'username', 'email', 'full_name', 'role', 'password')
 
-class User(UserMixin):
     def __init__(self, id, username, email, full_name, role, password=None):
         self.id = id
         self.username = username
@@ -11,23 +18,82 @@ class User(UserMixin):
         self.role = role
         self.password = password  # Used for comparison only, not stored in the object after login
 
+    @property
+    def is_active(self):
+        return True
+
+    @property
+    def is_authenticated(self):
+        return self.is_active
+
+    @property
+    def is_anonymous(self):
+        return False
+
+    def get_id(self):
+        return str(self.id)
+
+    def __eq__(self, other):
+        if isinstance(other, User):
+            return self.get_id() == other.get_id()
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        if equal is NotImplemented:
+            return NotImplemented
+        return not equal
+
+    __hash__ = object.__hash__
+
     @staticmethod
     def get_by_id(user_id):
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            return None
+
+        # The cache holds only non-secret fields, never the password hash
+        cached = user_cache.get(user_id)
+        if cached is not None:
+            return User(*cached)
+
         cursor = mysql.connection.cursor()
-        cursor.execute("SELECT * FROM users WHERE id = %s", (user_id,))
+        cursor.execute("SELECT id, username, email, full_name, role FROM users WHERE id = %s", (user_id,))
         user = cursor.fetchone()
         cursor.close()
 
         if user:
-            return User(
-                id=user['id'],
-                username=user['username'],
-                email=user['email'],
-                full_name=user['full_name'],
-                role=user['role']
-            )
+            fields = (user['id'], user['username'], user['email'], user['full_name'], user['role'])
+            user_cache.set(user_id, fields)
+            return User(*fields)
         return None
 
+    @staticmethod
+    def invalidate_cache(user_id):
+        user_cache.delete(int(user_id))
+
+    @staticmethod
+    def update_user(user_id, email=None, full_name=None, role=None, password=None):
+        """Update the given fields of a user and drop the cached copy"""
+        updates = []
+        params = []
+        for column, value in (('email', email), ('full_name', full_name), ('role', role), ('password', password)):
+            if value is not None:
+                updates.append(f"{column} = %s")
+                params.append(value)
+        if not updates:
+            return False
+
+        cursor = mysql.connection.cursor()
+        cursor.execute(f"UPDATE users SET {', '.join(updates)} WHERE id = %s", params + [user_id])
+        updated = cursor.rowcount > 0
+        mysql.connection.commit()
+        cursor.close()
+
+        User.invalidate_cache(user_id)
+        return updated
+
     @staticmethod
     def get_by_username(username):
         cursor = mysql.connection.cursor()
@@ -36,14 +102,7 @@ class User(UserMixin):
         cursor.close()
 
         if user:
-            return User(
-                id=user['id'],
-                username=user['username'],
-                email=user['email'],
-                full_name=user['full_name'],
-                role=user['role'],
-                password=user['password']
-            )
+            return User.from_row(user)
         return None
     
     @staticmethod
@@ -64,4 +123,7 @@ class User(UserMixin):
         user_id = cursor.lastrowid
         mysql.connection.commit()
         cursor.close()
-        return user_id
\ No newline at end of file
+        return user_id
+
+
+User.from_row = staticmethod(make_row_mapper(User, User.__slots__))
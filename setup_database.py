@@ -1,11 +1,13 @@
 from flask import Flask
 from flask_mysqldb import MySQL
+import argparse
 import bcrypt
 import os
 import sys
 
 # Import your config
 from config import Config
+from models.exam_stats_rollup import REBUILD_SQL as EXAM_STATS_REBUILD_SQL
 
 app = Flask(__name__)
 app.config.from_object(Config)
@@ -13,12 +15,55 @@ app.config.from_object(Config)
 # Initialize MySQL
 mysql = MySQL(app)
 
-def setup_database():
-    with app.app_context():
-        cursor = mysql.connection.cursor()
-        
-        # Create users table
-        cursor.execute('''
+# Migration steps. Each step inspects the live schema and returns the SQL
+# statements still needed, so re-running a migration is always safe.
+# `planned` holds the tables a dry run would have created by then, which
+# don't exist yet and so can't be inspected.
+
+def table_missing(cursor, table, planned):
+    if table in planned:
+        return True
+    cursor.execute("SHOW TABLES LIKE %s", (table,))
+    return cursor.fetchone() is None
+
+def create_table(table, ddl):
+    def step(cursor, planned):
+        return [ddl.strip()] if table_missing(cursor, table, planned) else []
+    step.creates = table
+    return step
+
+def add_column(table, column, definition):
+    def step(cursor, planned):
+        statement = f"ALTER TABLE {table} ADD COLUMN {column} {definition}"
+        if table_missing(cursor, table, planned):
+            return [statement]
+        cursor.execute(f"SHOW COLUMNS FROM {table} LIKE %s", (column,))
+        return [] if cursor.fetchone() else [statement]
+    return step
+
+def run_sql(sql):
+    # For statements that are idempotent by themselves, e.g. upserting backfills
+    def step(cursor, planned):
+        return [sql.strip()]
+    return step
+
+def add_index(table, index, columns):
+    def step(cursor, planned):
+        statement = f"CREATE INDEX {index} ON {table} ({', '.join(columns)})"
+        if table_missing(cursor, table, planned):
+            return [statement]
+        cursor.execute("""
+            SELECT 1 FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+            LIMIT 1
+        """, (table, index))
+        return [] if cursor.fetchone() else [statement]
+    return step
+
+# (version, description, steps) in the order they are applied
+MIGRATIONS = [
+    (1, 'Initial schema', [
+        create_table('users', '''
         CREATE TABLE IF NOT EXISTS users (
             id INT AUTO_INCREMENT PRIMARY KEY,
             username VARCHAR(100) UNIQUE NOT NULL,
@@ -28,10 +73,8 @@ def setup_database():
             role VARCHAR(50) NOT NULL,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
-        ''')
-        
-        # Create exams table
-        cursor.execute('''
+        '''),
+        create_table('exams', '''
         CREATE TABLE IF NOT EXISTS exams (
             id INT AUTO_INCREMENT PRIMARY KEY,
             title VARCHAR(255) NOT NULL,
@@ -43,10 +86,8 @@ def setup_database():
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (created_by) REFERENCES users(id)
         )
-        ''')
-        
-        # Create questions table
-        cursor.execute('''
+        '''),
+        create_table('questions', '''
         CREATE TABLE IF NOT EXISTS questions (
             id INT AUTO_INCREMENT PRIMARY KEY,
             exam_id INT NOT NULL,
@@ -59,10 +100,8 @@ def setup_database():
             marks INT NOT NULL,
             FOREIGN KEY (exam_id) REFERENCES exams(id) ON DELETE CASCADE
         )
-        ''')
-        
-        # Create exam_sessions table with student_id instead of user_id
-        cursor.execute('''
+        '''),
+        create_table('exam_sessions', '''
         CREATE TABLE IF NOT EXISTS exam_sessions (
             id INT AUTO_INCREMENT PRIMARY KEY,
             student_id INT NOT NULL,
@@ -74,10 +113,8 @@ def setup_database():
             FOREIGN KEY (student_id) REFERENCES users(id),
             FOREIGN KEY (exam_id) REFERENCES exams(id)
         )
-        ''')
-        
-        # Create student_answers table
-        cursor.execute('''
+        '''),
+        create_table('student_answers', '''
         CREATE TABLE IF NOT EXISTS student_answers (
             id INT AUTO_INCREMENT PRIMARY KEY,
             session_id INT NOT NULL,
@@ -87,47 +124,222 @@ def setup_database():
             FOREIGN KEY (session_id) REFERENCES exam_sessions(id) ON DELETE CASCADE,
             FOREIGN KEY (question_id) REFERENCES questions(id) ON DELETE CASCADE
         )
-        ''')
-        
-        # Create proctoring_logs table
-        cursor.execute('''
+        '''),
+        create_table('proctoring_logs', '''
         CREATE TABLE IF NOT EXISTS proctoring_logs (
             id INT AUTO_INCREMENT PRIMARY KEY,
             session_id INT NOT NULL,
             log_type VARCHAR(50) NOT NULL,
             details TEXT,
             screenshot MEDIUMTEXT,
+            screenshot_path VARCHAR(255),
             timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (session_id) REFERENCES exam_sessions(id) ON DELETE CASCADE
         )
-        ''')
-        
-        # Check if admin already exists
-        cursor.execute("SELECT * FROM users WHERE role = 'admin'")
-        admin = cursor.fetchone()
+        '''),
+        # Older databases store screenshots inline, add the column for the on-disk store
+        add_column('proctoring_logs', 'screenshot_path', 'VARCHAR(255)'),
+    ]),
+    (2, 'Indexes for hot session, proctoring and schedule queries', [
+        # Student lookups: active/completed session checks and dashboard counts
+        add_index('exam_sessions', 'idx_sessions_student_exam_status', ['student_id', 'exam_id', 'status']),
+        # Results pages: completed sessions of an exam ordered by score
+        add_index('exam_sessions', 'idx_sessions_exam_status_score', ['exam_id', 'status', 'score']),
+        # Proctoring log listing ordered by time and violation summaries by type
+        add_index('proctoring_logs', 'idx_logs_session_timestamp', ['session_id', 'timestamp']),
+        add_index('proctoring_logs', 'idx_logs_session_type', ['session_id', 'log_type']),
+        # Active and upcoming exam lookups
+        add_index('exams', 'idx_exams_schedule', ['start_time', 'end_time']),
+    ]),
+    (3, 'Per-student summary table for the student dashboard', [
+        create_table('student_summaries', '''
+        CREATE TABLE IF NOT EXISTS student_summaries (
+            student_id INT PRIMARY KEY,
+            completed_count INT NOT NULL DEFAULT 0,
+            score_sum BIGINT NOT NULL DEFAULT 0,
+            score_count INT NOT NULL DEFAULT 0,
+            last_completed_at DATETIME,
+            FOREIGN KEY (student_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+        '''),
+        run_sql('''
+        INSERT INTO student_summaries (student_id, completed_count, score_sum, score_count, last_completed_at)
+        SELECT student_id, COUNT(*), COALESCE(SUM(score), 0), COUNT(score), MAX(end_time)
+        FROM exam_sessions
+        WHERE status = 'completed'
+        GROUP BY student_id
+        ON DUPLICATE KEY UPDATE
+            completed_count = VALUES(completed_count),
+            score_sum = VALUES(score_sum),
+            score_count = VALUES(score_count),
+            last_completed_at = VALUES(last_completed_at)
+        '''),
+        # Recent completed sessions on the dashboard
+        add_index('exam_sessions', 'idx_sessions_student_status_end', ['student_id', 'status', 'end_time']),
+    ]),
+    (4, 'Per-exam result rollup table for the results page', [
+        create_table('exam_stats', '''
+        CREATE TABLE IF NOT EXISTS exam_stats (
+            exam_id INT PRIMARY KEY,
+            total_marks INT NOT NULL DEFAULT 0,
+            completed_count INT NOT NULL DEFAULT 0,
+            score_sum BIGINT NOT NULL DEFAULT 0,
+            score_sq_sum BIGINT NOT NULL DEFAULT 0,
+            min_score INT,
+            max_score INT,
+            pass_count INT NOT NULL DEFAULT 0,
+            bucket_0 INT NOT NULL DEFAULT 0,
+            bucket_1 INT NOT NULL DEFAULT 0,
+            bucket_2 INT NOT NULL DEFAULT 0,
+            bucket_3 INT NOT NULL DEFAULT 0,
+            bucket_4 INT NOT NULL DEFAULT 0,
+            bucket_5 INT NOT NULL DEFAULT 0,
+            bucket_6 INT NOT NULL DEFAULT 0,
+            bucket_7 INT NOT NULL DEFAULT 0,
+            bucket_8 INT NOT NULL DEFAULT 0,
+            bucket_9 INT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            FOREIGN KEY (exam_id) REFERENCES exams(id) ON DELETE CASCADE
+        )
+        '''),
+        # Backfill with the rollup's own rebuild statement, so buckets and pass mark can't drift
+        run_sql(EXAM_STATS_REBUILD_SQL.format(where="")),
+    ]),
+    (5, 'Occurrence counts for coalesced proctoring events', [
+        # A row stands for occurrence_count repeats of one event, from timestamp to last_timestamp
+        add_column('proctoring_logs', 'occurrence_count', 'INT NOT NULL DEFAULT 1'),
+        add_column('proctoring_logs', 'last_timestamp', 'DATETIME'),
+    ]),
+    (6, 'Autosaved answer drafts of in-progress sessions', [
+        create_table('answer_drafts', '''
+        CREATE TABLE IF NOT EXISTS answer_drafts (
+            session_id INT NOT NULL,
+            question_id INT NOT NULL,
+            selected_option CHAR(1) NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            PRIMARY KEY (session_id, question_id),
+            FOREIGN KEY (session_id) REFERENCES exam_sessions(id) ON DELETE CASCADE
+        )
+        '''),
+    ]),
+    (7, 'Queue of submitted exams waiting to be graded', [
+        create_table('grading_jobs', '''
+        CREATE TABLE IF NOT EXISTS grading_jobs (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            session_id INT NOT NULL UNIQUE,
+            answers MEDIUMTEXT,
+            status VARCHAR(20) NOT NULL DEFAULT 'queued',
+            attempts INT NOT NULL DEFAULT 0,
+            claim_token CHAR(32),
+            score FLOAT,
+            error TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            started_at DATETIME,
+            finished_at DATETIME,
+            INDEX idx_grading_jobs_status (status, id),
+            INDEX idx_grading_jobs_claim (claim_token),
+            FOREIGN KEY (session_id) REFERENCES exam_sessions(id) ON DELETE CASCADE
+        )
+        '''),
+    ]),
+    (8, 'Question version of each exam for cache validation across processes', [
+        add_column('exams', 'question_version', 'INT NOT NULL DEFAULT 0'),
+    ]),
+]
+
+def ensure_migrations_table(cursor):
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT PRIMARY KEY,
+        description VARCHAR(255) NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+def get_applied_versions(cursor):
+    cursor.execute("SHOW TABLES LIKE 'schema_migrations'")
+    if not cursor.fetchone():
+        return set()
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row['version'] for row in cursor.fetchall()}
+
+def run_migrations(cursor, dry_run=False):
+    """
+    Apply every migration that isn't recorded in schema_migrations yet.
+    With dry_run, only print the SQL that would be executed.
+    """
+    applied = get_applied_versions(cursor)
+    if not dry_run:
+        ensure_migrations_table(cursor)
+    
+    pending = [migration for migration in MIGRATIONS if migration[0] not in applied]
+    if not pending:
+        print("Database schema is up to date.")
+        return []
+    
+    # Tables a dry run only printed the CREATE TABLE for
+    planned = set()
+    for version, description, steps in pending:
+        print(f"Migration {version}: {description}")
+        for step in steps:
+            statements = step(cursor, planned)
+            for statement in statements:
+                print(f"  {' '.join(statement.split())}")
+                if not dry_run:
+                    cursor.execute(statement)
+            if dry_run and statements and getattr(step, 'creates', None):
+                planned.add(step.creates)
         
-        if not admin:
-            # Create admin user
-            username = "admin"
-            password = "Chandana"  # You should change this
-            email = "admin@example.com"
-            full_name = "System Administrator"
-            role = "admin"
-            
-            # Hash the password
-            hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-            
-            # Insert admin user
+        if not dry_run:
             cursor.execute("""
-                INSERT INTO users (username, password, email, full_name, role)
-                VALUES (%s, %s, %s, %s, %s)
-            """, (username, hashed_password, email, full_name, role))
-            
-            print("Admin user created successfully.")
-            print(f"Username: {username}")
-            print(f"Password: {password}")
-        else:
-            print("Admin user already exists.")
+                INSERT INTO schema_migrations (version, description)
+                VALUES (%s, %s)
+            """, (version, description))
+            mysql.connection.commit()
+    
+    if dry_run:
+        print(f"Dry run: {len(pending)} migration(s) pending, nothing was changed.")
+    return [migration[0] for migration in pending]
+
+def create_admin_user(cursor):
+    # Check if admin already exists
+    cursor.execute("SELECT * FROM users WHERE role = 'admin'")
+    admin = cursor.fetchone()
+    
+    if not admin:
+        # Create admin user
+        username = "admin"
+        password = "Chandana"  # You should change this
+        email = "admin@example.com"
+        full_name = "System Administrator"
+        role = "admin"
+        
+        # Hash the password
+        hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        
+        # Insert admin user
+        cursor.execute("""
+            INSERT INTO users (username, password, email, full_name, role)
+            VALUES (%s, %s, %s, %s, %s)
+        """, (username, hashed_password, email, full_name, role))
+        
+        print("Admin user created successfully.")
+        print(f"Username: {username}")
+        print(f"Password: {password}")
+    else:
+        print("Admin user already exists.")
+
+def setup_database(dry_run=False):
+    with app.app_context():
+        cursor = mysql.connection.cursor()
+        
+        run_migrations(cursor, dry_run=dry_run)
+        
+        if dry_run:
+            cursor.close()
+            return
+        
+        create_admin_user(cursor)
         
         mysql.connection.commit()
         cursor.close()
@@ -135,4 +347,7 @@ def setup_database():
         print("Database setup completed successfully!")
 
 if __name__ == "__main__":
-    setup_database()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Create or upgrade the exam portal database schema')
+    parser.add_argument('--dry-run', action='store_true', help='Print pending migrations without applying them')
+    args = parser.parse_args()
+    setup_database(dry_run=args.dry_run)
\ No newline at end of file
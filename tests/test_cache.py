@@ -0,0 +1,107 @@
+import threading
+
+from models.cache import TTLCache, VersionedCache
+
+
+class Loader:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, key, version):
+        self.calls.append((key, version))
+        return ('value', key, version, len(self.calls))
+
+
+def test_ttl_cache_expires_and_evicts_least_recently_used():
+    cache = TTLCache(max_size=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+
+    cache.configure(ttl=0)
+    assert cache.get('a') is None
+
+
+def test_versioned_cache_loads_once_per_key_and_normalizes_keys():
+    loader = Loader()
+    cache = VersionedCache(loader, key_type=int)
+    first = cache.get('5')
+    assert cache.get(5) is first
+    assert loader.calls == [(5, None)]
+
+
+def test_versioned_cache_reloads_when_stored_version_changes():
+    versions = {1: 3}
+    loader = Loader()
+    cache = VersionedCache(loader, version_of=versions.get)
+    assert cache.get(1)[2] == 3
+    versions[1] = 4
+    assert cache.get(1)[2] == 4
+    assert loader.calls == [(1, 3), (1, 4)]
+
+
+def test_invalidate_drops_every_version_of_the_key_only():
+    loader = Loader()
+    cache = VersionedCache(loader)
+    cache.get(1)
+    cache.get(2)
+    cache.invalidate(1)
+    cache.get(1)
+    cache.get(2)
+    assert loader.calls == [(1, None), (2, None), (1, None)]
+
+
+def test_value_loaded_during_invalidation_is_not_cached():
+    cache = None
+
+    def loader(key, version):
+        # A question change lands while the old value is being read
+        cache.invalidate(key)
+        return 'stale'
+
+    cache = VersionedCache(loader)
+    assert cache.get(1) == 'stale'
+    assert cache.stats()['size'] == 0
+
+
+def test_load_started_after_invalidation_is_cached():
+    loader = Loader()
+    cache = VersionedCache(loader)
+    cache.invalidate(1)
+    cache.get(1)
+    cache.get(1)
+    assert len(loader.calls) == 1
+
+
+def test_invalidation_records_stay_bounded():
+    cache = VersionedCache(Loader(), max_size=4)
+    for key in range(100):
+        cache.invalidate(key)
+    assert len(cache._invalidated) <= 4
+
+
+def test_invalidation_records_kept_for_loads_in_flight():
+    started = threading.Event()
+    release = threading.Event()
+
+    def loader(key, version):
+        if key == 'slow':
+            started.set()
+            release.wait(5)
+        return key
+
+    cache = VersionedCache(loader, max_size=2)
+    thread = threading.Thread(target=cache.get, args=('slow',))
+    thread.start()
+    started.wait(5)
+    for key in range(10):
+        cache.invalidate(key)
+    cache.invalidate('slow')
+    release.set()
+    thread.join(5)
+
+    # The slow load began before its key was invalidated, so its result was dropped
+    assert cache.stats()['size'] == 0
@@ -0,0 +1,40 @@
+from datetime import datetime
+
+from models.pagination import Page, decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip_keeps_datetimes_and_ids():
+    key = (datetime(2026, 3, 1, 9, 30, 15, 250000), 42)
+    assert decode_cursor(encode_cursor(key), 2) == key
+
+
+def test_cursor_is_url_safe_without_padding():
+    token = encode_cursor(('title with spaces & symbols?', 7))
+    assert '=' not in token
+    assert '+' not in token and '/' not in token
+
+
+def test_decode_rejects_missing_malformed_and_wrong_size_tokens():
+    assert decode_cursor(None, 2) is None
+    assert decode_cursor('', 2) is None
+    assert decode_cursor('not a cursor!', 2) is None
+    assert decode_cursor(encode_cursor((1, 2, 3)), 2) is None
+
+
+def test_decode_rejects_bad_datetime():
+    token = encode_cursor(({'dt': 'yesterday'}, 1))
+    assert decode_cursor(token, 2) is None
+
+
+def test_page_build_trims_extra_row_into_cursor():
+    rows = [{'id': index} for index in range(4)]
+    page = Page.build(rows, 3, lambda row: (row['id'],))
+    assert [row['id'] for row in page] == [0, 1, 2]
+    assert page.has_next
+    assert decode_cursor(page.next_cursor, 1) == (2,)
+
+
+def test_page_build_last_page_has_no_cursor():
+    page = Page.build([{'id': 1}], 3, lambda row: (row['id'],))
+    assert len(page) == 1
+    assert not page.has_next
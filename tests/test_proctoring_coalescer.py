@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from models.proctoring_coalescer import ProctoringEventCoalescer
+
+START = datetime(2026, 5, 4, 10, 0, 0)
+
+
+def make_coalescer(**config):
+    config.setdefault('PROCTORING_COALESCE_WINDOW_SECONDS', 30)
+    return ProctoringEventCoalescer(SimpleNamespace(config=config))
+
+
+def test_repeat_within_window_matches_the_tracked_row():
+    coalescer = make_coalescer()
+    coalescer.remember(7, 'tab_switch', 100, None, START)
+    assert coalescer.match('7', 'tab_switch', None, START + timedelta(seconds=20)) == (100, None)
+    assert coalescer.stats()['coalesced'] == 1
+
+
+def test_window_slides_with_each_occurrence():
+    coalescer = make_coalescer()
+    coalescer.remember(7, 'tab_switch', 100, None, START)
+    for seconds in (25, 50, 75):
+        assert coalescer.match(7, 'tab_switch', None, START + timedelta(seconds=seconds))
+    assert coalescer.match(7, 'tab_switch', None, START + timedelta(seconds=110)) is None
+
+
+def test_other_log_types_and_sessions_start_their_own_rows():
+    coalescer = make_coalescer()
+    coalescer.remember(7, 'tab_switch', 100, None, START)
+    assert coalescer.match(7, 'face_missing', None, START) is None
+    assert coalescer.match(8, 'tab_switch', None, START) is None
+
+
+def test_only_the_same_screenshot_continues_a_run():
+    coalescer = make_coalescer()
+    coalescer.remember(7, 'face_missing', 100, 'ab/frame.jpg', START)
+    assert coalescer.match(7, 'face_missing', 'cd/other.jpg', START + timedelta(seconds=1)) is None
+    assert coalescer.match(7, 'face_missing', 'ab/frame.jpg', START + timedelta(seconds=2)) == (100, 'ab/frame.jpg')
+    assert coalescer.match(7, 'face_missing', None, START + timedelta(seconds=3)) == (100, 'ab/frame.jpg')
+
+
+def test_zero_window_disables_coalescing():
+    coalescer = make_coalescer(PROCTORING_COALESCE_WINDOW_SECONDS=0)
+    coalescer.remember(7, 'tab_switch', 100, None, START)
+    assert not coalescer.enabled
+    assert coalescer.match(7, 'tab_switch', None, START) is None
+
+
+def test_forget_only_uncounts_a_run_it_removes():
+    coalescer = make_coalescer()
+    coalescer.remember(7, 'tab_switch', 100, None, START)
+    coalescer.match(7, 'tab_switch', None, START)
+
+    coalescer.forget(7, 'tab_switch', 999)
+    coalescer.forget(8, 'tab_switch', 100)
+    assert coalescer.stats()['coalesced'] == 1
+
+    coalescer.forget(7, 'tab_switch', 100)
+    assert coalescer.stats()['coalesced'] == 0
+    assert coalescer.match(7, 'tab_switch', None, START) is None
+
+
+def test_tracked_runs_are_evicted_least_recently_used():
+    coalescer = make_coalescer(PROCTORING_COALESCE_MAX_KEYS=2)
+    coalescer.remember(1, 'a', 10, None, START)
+    coalescer.remember(2, 'a', 20, None, START)
+    coalescer.match(1, 'a', None, START)
+    coalescer.remember(3, 'a', 30, None, START)
+    assert coalescer.stats()['tracked'] == 2
+    assert coalescer.match(2, 'a', None, START) is None
+    assert coalescer.match(1, 'a', None, START) == (10, None)
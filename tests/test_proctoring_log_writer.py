@@ -0,0 +1,76 @@
+from contextlib import nullcontext
+from types import SimpleNamespace
+
+import pytest
+
+from models.proctoring import ProctoringLog, ProctoringLogWriter
+
+
+@pytest.fixture
+def writer():
+    log_writer = ProctoringLogWriter()
+    log_writer.app = SimpleNamespace(app_context=nullcontext)
+    log_writer.max_retries = 2
+    log_writer.retry_backoff = 0
+    return log_writer
+
+
+def fake_bulk(monkeypatch, outcomes):
+    """Have create_logs_bulk answer each call with the next outcome, an exception or a results function"""
+    calls = []
+
+    def create_logs_bulk(events):
+        calls.append([event['log_type'] for event in events])
+        outcome = outcomes[min(len(calls), len(outcomes)) - 1]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return [outcome(event) for event in events]
+
+    monkeypatch.setattr(ProctoringLog, 'create_logs_bulk', staticmethod(create_logs_bulk))
+    return calls
+
+
+def test_database_errors_are_retried_until_written(writer, monkeypatch):
+    calls = fake_bulk(monkeypatch, [
+        lambda event: {'error': 'gone away', 'retryable': True} if event['log_type'] == 'b' else {'log_id': 1},
+        lambda event: {'log_id': 2},
+    ])
+    writer._flush([{'log_type': 'a'}, {'log_type': 'b'}])
+
+    assert calls == [['a', 'b'], ['b']]
+    stats = writer.stats()
+    assert (stats['written'], stats['retried'], stats['failed'], stats['lost']) == (2, 1, 0, 0)
+
+
+def test_rejected_events_are_not_retried(writer, monkeypatch):
+    calls = fake_bulk(monkeypatch, [lambda event: {'error': 'Invalid session_id: 9'}])
+    writer._flush([{'log_type': 'a'}])
+
+    assert calls == [['a']]
+    assert writer.stats()['failed'] == 1
+
+
+def test_events_still_failing_after_the_last_retry_are_counted_lost(writer, monkeypatch):
+    calls = fake_bulk(monkeypatch, [RuntimeError('database down')])
+    writer._flush([{'log_type': 'a'}, {'log_type': 'b'}])
+
+    assert len(calls) == writer.max_retries + 1
+    stats = writer.stats()
+    assert (stats['written'], stats['retried'], stats['lost'], stats['flushes']) == (0, 4, 2, 3)
+
+
+def test_enqueue_stores_the_screenshot_and_queues_its_path(writer, monkeypatch):
+    import queue
+    from models.schema import schema_registry
+
+    monkeypatch.setattr(schema_registry, 'has_column', lambda table, column, fresh=False: True)
+    monkeypatch.setattr(ProctoringLog, '_process_screenshot',
+                        staticmethod(lambda screenshot, session_id, log_type: 'ab/abcdef.jpg'))
+    monkeypatch.setattr(writer, '_ensure_started', lambda: None)
+    writer._queue = queue.Queue(maxsize=10)
+
+    assert writer.enqueue({'session_id': 5, 'log_type': 'face_missing', 'screenshot': 'data:image/jpeg;base64,AAAA'})
+    event = writer._queue.get_nowait()
+    assert 'screenshot' not in event
+    assert event['screenshot_path'] == 'ab/abcdef.jpg'
+    assert 'received_at' in event
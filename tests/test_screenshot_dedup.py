@@ -0,0 +1,64 @@
+import io
+from types import SimpleNamespace
+
+import pytest
+
+from models.screenshot_dedup import NearDuplicateFilter, hamming_distance, perceptual_hash
+
+
+def make_filter(**config):
+    config.setdefault('SCREENSHOT_DEDUP_MAX_DISTANCE', 6)
+    duplicate_filter = NearDuplicateFilter()
+    duplicate_filter.init_app(SimpleNamespace(config=config))
+    return duplicate_filter
+
+
+def test_hamming_distance_counts_differing_bits():
+    assert hamming_distance(0, 0) == 0
+    assert hamming_distance(0b1011, 0b0001) == 2
+    assert hamming_distance(2 ** 64 - 1, 0) == 64
+
+
+def test_near_hash_within_the_same_session_and_log_type_is_found():
+    duplicate_filter = make_filter()
+    duplicate_filter.remember(7, 'face_missing', 0b1111, 'ab/frame.jpg')
+    assert duplicate_filter.find(7, 'face_missing', 0b0111) == 'ab/frame.jpg'
+    assert duplicate_filter.find(7, 'face_missing', 2 ** 64 - 1) is None
+
+
+def test_windows_are_kept_per_session_and_log_type():
+    duplicate_filter = make_filter()
+    duplicate_filter.remember(7, 'face_missing', 0, 'ab/frame.jpg')
+    assert duplicate_filter.find(7, 'multiple_faces', 0) is None
+    assert duplicate_filter.find(8, 'face_missing', 0) is None
+
+
+def test_window_holds_the_most_recent_frames_only():
+    duplicate_filter = make_filter(SCREENSHOT_DEDUP_WINDOW=2, SCREENSHOT_DEDUP_MAX_DISTANCE=0)
+    for index in range(3):
+        duplicate_filter.remember(7, 'face_missing', index, f'frame-{index}.jpg')
+    assert duplicate_filter.find(7, 'face_missing', 0) is None
+    assert duplicate_filter.find(7, 'face_missing', 2) == 'frame-2.jpg'
+
+
+def _jpeg(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def test_perceptual_hash_tolerates_recompression_but_not_different_frames():
+    Image = pytest.importorskip('PIL.Image')
+    gradient = Image.linear_gradient('L').resize((320, 240)).convert('RGB')
+    flipped = gradient.transpose(Image.Transpose.FLIP_TOP_BOTTOM).rotate(90, expand=True).resize((320, 240))
+
+    original = perceptual_hash(_jpeg(gradient))
+    recompressed = perceptual_hash(_jpeg(gradient.resize((160, 120))))
+    other = perceptual_hash(_jpeg(flipped))
+    assert hamming_distance(original, recompressed) <= 6
+    assert hamming_distance(original, other) > 6
+
+
+def test_perceptual_hash_of_undecodable_bytes_is_none():
+    pytest.importorskip('PIL.Image')
+    assert perceptual_hash(b'not an image') is None